@@ -0,0 +1,294 @@
+# The Voynich Transliteration Tool
+# Analysis Metrics
+#
+# Pure statistics shared by main.py's analysis report, batch.py's mapping
+# search and compare.py. Nothing here reads config.json or writes files.
+
+### Imports ###
+import math
+from collections import Counter
+
+
+def char_entropy(counts):
+  """Shannon entropy in bits of a Counter of characters."""
+  total_chars = sum(counts.values())
+  e = 0.0
+  for count in counts.values():
+    p = count / total_chars
+    e -= p * math.log2(p)
+  return e
+
+
+def adjacent_pairs(valid_chars):
+  """Counts each adjacent (a, b) pair of a character sequence."""
+  return Counter(zip(valid_chars, valid_chars[1:]))
+
+
+def sukhotin_classify(alphabet, pairs):
+  """
+  Sukhotin's vowel identification algorithm.
+  alphabet is the sorted list of characters and pairs a Counter of adjacent
+  (a, b) characters. Returns (steps, vowels, consonants), where steps lists
+  each (vowel, score) in the order it was identified.
+
+  A character's score is its adjacency count with every remaining consonant.
+  The scores are kept as running row sums: when a character becomes a vowel,
+  its column is subtracted from every row instead of recomputing all rows.
+  Uses NumPy when it is installed.
+  """
+  n = len(alphabet)
+  if n == 0: return [], [], []
+  char_to_index = {c: i for i, c in enumerate(alphabet)}
+
+  try:
+    import numpy as np
+  except ImportError:
+    np = None
+
+  steps = []
+  if np is not None:
+    codes = np.array([char_to_index[a] * n + char_to_index[b] for a, b in pairs], dtype=np.int64)
+    weights = np.array(list(pairs.values()), dtype=np.int64)
+    matrix = np.bincount(codes, weights=weights, minlength=n * n).astype(np.int64).reshape(n, n)
+    matrix += matrix.T
+    scores = matrix.sum(axis=1)
+    is_vowel = np.zeros(n, dtype=bool)
+    while True:
+      # Vowels score -1 so they are never picked again (real scores are >= 0)
+      candidate_idx = int(np.argmax(np.where(is_vowel, -1, scores)))
+      max_score = -1 if is_vowel[candidate_idx] else int(scores[candidate_idx])
+      if max_score <= 0: break
+      is_vowel[candidate_idx] = True
+      scores -= matrix[:, candidate_idx]
+      steps.append((alphabet[candidate_idx], max_score))
+    is_vowel = is_vowel.tolist()
+  else:
+    matrix = [[0] * n for _ in range(n)]
+    for (a, b), count in pairs.items():
+      i = char_to_index[a]
+      j = char_to_index[b]
+      matrix[i][j] += count
+      matrix[j][i] += count
+    scores = [sum(row) for row in matrix]
+    is_vowel = [False] * n
+    while True:
+      candidate_idx = None
+      max_score = 0
+      for i in range(n):
+        if not is_vowel[i] and (candidate_idx is None or scores[i] > max_score):
+          candidate_idx = i
+          max_score = scores[i]
+      if candidate_idx is None or max_score <= 0: break
+      is_vowel[candidate_idx] = True
+      for i in range(n):
+        scores[i] -= matrix[i][candidate_idx]
+      steps.append((alphabet[candidate_idx], max_score))
+
+  vowels = [alphabet[i] for i in range(n) if is_vowel[i]]
+  consonants = [alphabet[i] for i in range(n) if not is_vowel[i]]
+  return steps, vowels, consonants
+
+
+def sorted_frequencies(word_counts, np):
+  return np.sort(np.fromiter(word_counts.values(), dtype=np.float64, count=len(word_counts)))[::-1]
+
+
+def zipf_fit(word_counts):
+  """
+  Least-squares fit of log(frequency) against log(rank).
+  Returns (exponent, r_squared); the exponent is the negated slope, so
+  natural languages land near 1.0. Returns (None, None) for fewer than 2 words.
+  Vectorized with NumPy when it is installed.
+  """
+  try:
+    import numpy as np
+  except ImportError:
+    np = None
+  n = len(word_counts)
+  if n < 2: return None, None
+
+  if np is not None:
+    xs = np.log(np.arange(1, n + 1, dtype=np.float64))
+    ys = np.log(sorted_frequencies(word_counts, np))
+    xs -= xs.mean()
+    ys -= ys.mean()
+    sxx = float(xs @ xs)
+    sxy = float(xs @ ys)
+    syy = float(ys @ ys)
+  else:
+    frequencies = sorted(word_counts.values(), reverse=True)
+    xs = [math.log(rank) for rank in range(1, n + 1)]
+    ys = [math.log(f) for f in frequencies]
+    mean_x = sum(xs) / n
+    mean_y = sum(ys) / n
+    sxx = sum((x - mean_x) ** 2 for x in xs)
+    sxy = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys))
+    syy = sum((y - mean_y) ** 2 for y in ys)
+  slope = sxy / sxx
+  r_squared = (sxy * sxy) / (sxx * syy) if syy else 1.0
+  return -slope, r_squared
+
+
+def zipf_points(word_counts, bins_per_decade=20):
+  """
+  (ranks, frequencies) of the Zipf plot as NumPy arrays (NumPy required).
+  With bins_per_decade, the ranks of each 1/bins_per_decade of a power of
+  ten are drawn as one point at their geometric mean rank and mean
+  frequency, so the plot has a few hundred points however many words there
+  are. Low ranks keep a point each. 0 or None keeps every rank.
+  """
+  import numpy as np
+  frequencies = sorted_frequencies(word_counts, np)
+  ranks = np.arange(1, len(frequencies) + 1, dtype=np.float64)
+  if not bins_per_decade or not len(frequencies):
+    return ranks, frequencies
+  bins = np.floor(np.log10(ranks) * bins_per_decade).astype(np.int64)
+  sizes = np.bincount(bins)
+  used = sizes > 0
+  log_ranks = np.bincount(bins, np.log(ranks))[used] / sizes[used]
+  return np.exp(log_ranks), np.bincount(bins, frequencies)[used] / sizes[used]
+
+
+### Single-Pass Statistics ###
+class TextStatistics:
+  """
+  Every counter the analysis report needs, filled by one pass over the words
+  of the transliterated text. Only per-word counts and the counters that need
+  word order (reduplication, adjacency across words) are updated per word;
+  character, n-gram and within-word adjacency counts are derived afterwards
+  from the distinct words weighted by their counts. Distinct words keep their
+  first-occurrence order, so most_common() ties come out in text order.
+  """
+
+  def __init__(self):
+    self.word_counts = Counter()
+    self.reduplications = Counter()
+    self.boundary_pairs = Counter()
+    self.newlines = 0
+    self.previous_word = None
+    self.previous_edge = None
+    self.edges = {}
+
+  def add_word(self, word):
+    self.word_counts[word] += 1
+    if word == self.previous_word:
+      self.reduplications[word] += 1
+    self.previous_word = word
+
+    edge = self.edge(word)
+    if edge is not None:
+      if self.previous_edge is not None:
+        self.boundary_pairs[(self.previous_edge, edge[0])] += 1
+      self.previous_edge = edge[1]
+
+  def add_words(self, words):
+    for word in words:
+      self.add_word(word)
+
+  def edge(self, word):
+    """First and last letter/digit of a word, for adjacency across words. None if it has neither."""
+    edge = self.edges.get(word, False)
+    if edge is False:
+      valid = [c for c in word if c.isalnum()]
+      edge = self.edges[word] = (valid[0], valid[-1]) if valid else None
+    return edge
+
+  def add_segment(self, words, before, after, sign=1):
+    """
+    Adds (sign 1) or removes (sign -1) the counts of a run of words inside
+    the text, including the reduplication and adjacency pairs it forms with
+    its neighbours. before is the (word, last letter) preceding the run and
+    after the (word, first letter) following it; either part may be None.
+    Replacing a run is removing the old words and adding the new ones
+    between the same neighbours.
+    """
+    previous_word, previous_edge = before
+    for word in words:
+      self.word_counts[word] += sign
+      if word == previous_word:
+        self.reduplications[word] += sign
+      previous_word = word
+      edge = self.edge(word)
+      if edge is not None:
+        if previous_edge is not None:
+          self.boundary_pairs[(previous_edge, edge[0])] += sign
+        previous_edge = edge[1]
+
+    next_word, next_edge = after
+    if next_word is not None and next_word == previous_word:
+      self.reduplications[next_word] += sign
+    if next_edge is not None and previous_edge is not None:
+      self.boundary_pairs[(previous_edge, next_edge)] += sign
+
+  def reorder(self, words):
+    """Puts word_counts and reduplications back in first-occurrence order of the full word list."""
+    self.word_counts = Counter({word: self.word_counts[word] for word in dict.fromkeys(words)})
+    repeats = dict.fromkeys(a for a, b in zip(words, words[1:]) if a == b)
+    self.reduplications = Counter({word: self.reduplications[word] for word in repeats})
+
+  def prune(self):
+    """Drops the entries add_segment() brought down to zero."""
+    for counter in (self.word_counts, self.reduplications, self.boundary_pairs):
+      for key in [key for key, n in counter.items() if n <= 0]:
+        del counter[key]
+
+  @property
+  def total_words(self):
+    return sum(self.word_counts.values())
+
+  def char_counts(self):
+    """Counts of every character outside the delimiters, newlines included."""
+    counts = Counter()
+    for word, count in self.word_counts.items():
+      for c, n in Counter(word).items():
+        counts[c] += n * count
+    if self.newlines:
+      counts["\n"] += self.newlines
+    return counts
+
+  def ngram_counts(self, n):
+    """Returns Counters of the length-n prefixes, suffixes and affixes of every word."""
+    prefixes = Counter()
+    suffixes = Counter()
+    affixes = Counter()
+    for word, count in self.word_counts.items():
+      word_len = len(word)
+      if word_len < n: continue
+      prefixes[word[:n]] += count
+      suffixes[word[-n:]] += count
+      for i in range(0, word_len - n + 1):
+        affixes[word[i:i + n]] += count
+    return prefixes, suffixes, affixes
+
+  def adjacency(self):
+    """Returns (alphabet, pairs) of the letters/digits of the text with the delimiters removed."""
+    pairs = Counter(self.boundary_pairs)
+    alphabet = set()
+    for word, count in self.word_counts.items():
+      valid = [c for c in word if c.isalnum()]
+      alphabet.update(valid)
+      for pair, n in adjacent_pairs(valid).items():
+        pairs[pair] += n * count
+    return sorted(alphabet), pairs
+
+
+def summary(stats):
+  """
+  The headline metrics of a TextStatistics, as batch.py and compare.py
+  report them: entropy, character/word/distinct word counts, Sukhotin's
+  vowels and the Zipf fit (None without enough distinct words).
+  """
+  char_counts = stats.char_counts()
+  word_counts = stats.word_counts
+  alphabet, pairs = stats.adjacency()
+  _, vowels, _ = sukhotin_classify(alphabet, pairs) if alphabet else ([], [], [])
+  exponent, r_squared = zipf_fit(word_counts)
+  return {
+    "entropy": char_entropy(char_counts) if char_counts else 0.0,
+    "chars": sum(char_counts.values()),
+    "words": sum(word_counts.values()),
+    "distinct_words": len(word_counts),
+    "vowels": "".join(vowels),
+    "zipf_exponent": exponent,
+    "zipf_r2": r_squared,
+  }
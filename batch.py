@@ -0,0 +1,181 @@
+# The Voynich Transliteration Tool
+# Batch Mapping Search
+#
+# Evaluates many candidate mappings against the corpus selected in config.json
+# and writes one row of metrics (entropy, Sukhotin vowels, Zipf exponent) per
+# mapping. The corpus is read and split into words once; worker processes
+# receive it read-only and only transliterate its distinct words.
+#
+# Usage:
+#   python batch.py candidate_mappings/ -o results.csv
+#   python batch.py candidates.jsonl -o results.jsonl --workers 8
+#   python batch.py candidate_mappings/ --zipf-plots zipf_plots/
+
+### Imports ###
+import argparse
+import csv
+import importlib.util
+import json
+import os
+import sys
+import time
+from array import array
+from multiprocessing import Pool, cpu_count
+
+from analysis import TextStatistics, summary
+from cleaner import CleanedFile, read_selection
+from transliterator import (DEFAULT_SETTINGS, TRANSCRIPTIONS, Transliterator, compile_word_pattern,
+                            delimiter_table)
+from zipf import plot_zipf
+
+FIELDS = ["name", "entropy", "chars", "words", "distinct_words", "vowels", "zipf_exponent", "zipf_r2", "error"]
+
+
+### Corpus ###
+class Corpus:
+  """
+  The selected input split into words once. words holds each distinct word,
+  counts its number of occurrences, and tokens the word ids in text order.
+  Mapping rules only look inside a word, so a mapping's output for the whole
+  text can be rebuilt from the output of each distinct word.
+  """
+
+  def __init__(self, text, settings):
+    word_ids = {}
+    self.words = []
+    self.counts = array("I")
+    self.tokens = array("I")
+    for word in compile_word_pattern(delimiter_table(settings)).findall(text):
+      word_id = word_ids.get(word)
+      if word_id is None:
+        word_id = word_ids[word] = len(self.words)
+        self.words.append(word)
+        self.counts.append(0)
+      self.counts[word_id] += 1
+      self.tokens.append(word_id)
+    self.newlines = text.count("\n")
+
+
+def evaluate_mapping(corpus, transliterator, plot_path=None):
+  """Returns the metrics main.py's analysis would report for this mapping. Draws its Zipf plot to plot_path if given."""
+  outputs = [transliterator.split_words(transliterator.transliterate(word)) for word in corpus.words]
+  stats = TextStatistics()
+  for word_id in corpus.tokens:
+    stats.add_words(outputs[word_id])
+  stats.newlines = corpus.newlines
+
+  metrics = summary(stats)
+  exponent, r_squared = metrics["zipf_exponent"], metrics["zipf_r2"]
+  if plot_path:
+    plot_zipf(stats.word_counts, plot_path, fit=(exponent, r_squared))
+  metrics["entropy"] = round(metrics["entropy"], 6)
+  metrics["zipf_exponent"] = None if exponent is None else round(exponent, 6)
+  metrics["zipf_r2"] = None if r_squared is None else round(r_squared, 6)
+  return metrics
+
+
+### Workers ###
+worker_corpus = None
+worker_settings = None
+worker_plot_folder = None
+
+def init_worker(corpus, settings, plot_folder=None):
+  global worker_corpus, worker_settings, worker_plot_folder
+  worker_corpus = corpus
+  worker_settings = settings
+  worker_plot_folder = plot_folder
+
+
+def evaluate_candidate(candidate):
+  name, mapping = candidate
+  row = {"name": name}
+  plot_path = None
+  if worker_plot_folder:
+    plot_path = os.path.join(worker_plot_folder, "".join(c if c.isalnum() or c in "-_." else "_" for c in os.path.splitext(name)[0]) + ".png")
+  try:
+    # The corpus already holds each word once, so a word cache would only miss
+    transliterator = Transliterator(mapping, worker_settings, word_cache_size=0)
+    row.update(evaluate_mapping(worker_corpus, transliterator, plot_path))
+  except Exception as e:
+    row["error"] = f"{type(e).__name__}: {e}"
+  return row
+
+
+### Candidate Sources ###
+def iter_candidates(source):
+  """Yields (name, mapping) from a folder of .json mappings or a .jsonl file with one mapping per line."""
+  if os.path.isdir(source):
+    for filename in sorted(os.listdir(source)):
+      if filename.endswith(".json"):
+        with open(os.path.join(source, filename), "r", encoding="utf-8") as mapFile:
+          yield filename, json.load(mapFile)
+    return
+
+  with open(source, "r", encoding="utf-8") as jsonlFile:
+    for line_number, line in enumerate(jsonlFile, 1):
+      if not line.strip(): continue
+      entry = json.loads(line)
+      # Either {"name": ..., "mapping": {...}} or a bare mapping object
+      if isinstance(entry.get("mapping"), dict):
+        yield entry.get("name", f"line {line_number}"), entry["mapping"]
+      else:
+        yield f"line {line_number}", entry
+
+
+def open_writer(output_path):
+  outputFile = open(output_path, "w", encoding="utf-8", newline="")
+  if output_path.endswith(".csv"):
+    writer = csv.DictWriter(outputFile, fieldnames=FIELDS)
+    writer.writeheader()
+    return outputFile, writer.writerow
+  return outputFile, lambda row: outputFile.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Evaluate many candidate mappings against one corpus and write per-mapping metrics."
+  )
+  parser.add_argument("source", help="Folder of *_mapping.json files or a .jsonl file of mappings")
+  parser.add_argument("-o", "--output", default="batch_results.csv", help="Results file (.csv or .jsonl)")
+  parser.add_argument("-w", "--workers", type=int, default=cpu_count(), help="Worker processes (default: all cores)")
+  parser.add_argument("-c", "--config", default="config.json", help="Config file for the input and markers")
+  parser.add_argument("--zipf-plots", metavar="FOLDER", help="Also draw each mapping's Zipf plot into FOLDER (needs matplotlib)")
+  args = parser.parse_args()
+
+  if not os.path.exists(args.source):
+    print(f"ERROR: File not found: {args.source}")
+    sys.exit(1)
+
+  if args.zipf_plots:
+    # Checked up front without importing it; the workers import it when they plot
+    if importlib.util.find_spec("matplotlib") is None:
+      print("ERROR: --zipf-plots needs matplotlib.")
+      sys.exit(1)
+    os.makedirs(args.zipf_plots, exist_ok=True)
+
+  with open(args.config, "r", encoding="utf-8") as configFile:
+    config = json.load(configFile)
+  settings = {k: config.get(k, v) for k, v in DEFAULT_SETTINGS.items()}
+
+  inputPath, _ = TRANSCRIPTIONS[config["transliteration"]]
+  with CleanedFile(inputPath) as cleanedFile:
+    text, _ = read_selection(cleanedFile, config)
+  corpus = Corpus(text, settings)
+  print(f"Corpus: {len(corpus.tokens)} words, {len(corpus.words)} distinct.")
+
+  start = time.perf_counter()
+  evaluated = 0
+  outputFile, write_row = open_writer(args.output)
+  with outputFile, Pool(args.workers, initializer=init_worker, initargs=(corpus, settings, args.zipf_plots)) as pool:
+    for row in pool.imap(evaluate_candidate, iter_candidates(args.source), chunksize=4):
+      write_row(row)
+      evaluated += 1
+  elapsed = time.perf_counter() - start
+
+  print(f"Evaluated {evaluated} mappings in {elapsed:.2f}s ({evaluated / elapsed if elapsed else 0:.1f} mappings/s).")
+  print(f"Results: {args.output}")
+
+
+# Run main
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,544 @@
+# The Voynich Transliteration Tool
+# Benchmarks
+#
+# Times each stage of the pipeline in isolation on the bundled transcriptions
+# and on synthetic 10x/100x copies of them, and reports throughput, peak RSS
+# and allocations. Every stage runs in a fresh process, and its peak RSS is
+# reported next to the peak its inputs alone reached. Results can be saved as
+# a JSON baseline and compared against the baseline of another commit.
+#
+# Usage:
+#   python benchmark.py
+#   python benchmark.py -s transliterate sukhotin --scales 1 10
+#   python benchmark.py -o benchmarks/before.json
+#   python benchmark.py --compare benchmarks/before.json
+
+### Imports ###
+import argparse
+import atexit
+import contextlib
+import json
+import os
+import platform
+import random
+import re
+import runpy
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from functools import cached_property
+
+from analysis import TextStatistics, char_entropy, sukhotin_classify, zipf_fit
+from cleaner import CleanedFile, LocusIndex, StreamCleaner
+from fuzzy import FuzzyIndex, word_match
+from instrumentation import peak_rss_kb
+from report import comparison_lines, write_report
+from translation import LocalBackend, translate_text
+from transliterator import DEFAULT_SETTINGS, TRANSCRIPTIONS, Transliterator
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+RAW_TRANSCRIPTIONS = {"v101": "v101.txt", "eva": "eva.txt"}
+
+# Share of the words changed by one glyph in each extra copy of a scaled corpus
+MUTATION_RATE = 0.01
+# Fuzzy cutoff of the default toleranceLevel (2)
+FUZZY_CUTOFF = 0.75
+# A stage is repeated until it has run this long (or --repeat times), and the fastest run is kept
+MIN_TIME = 1.0
+
+
+### Workloads ###
+class Workload:
+  """
+  The inputs of every stage for one transcription at one scale, built on
+  first use and outside the timed runs. A corpus scaled by n is n copies of
+  the transcription; each copy after the first has MUTATION_RATE of its
+  words changed by one glyph, so its vocabulary grows the way a longer
+  manuscript's would instead of repeating exactly.
+  """
+
+  def __init__(self, transcription, scale):
+    self.transcription = transcription
+    self.scale = scale
+    self.cleaned_path, self.map_path = (os.path.join(ROOT, p) for p in TRANSCRIPTIONS[transcription])
+    self.raw_path = os.path.join(ROOT, RAW_TRANSCRIPTIONS[transcription])
+    self.settings = dict(DEFAULT_SETTINGS)
+
+  @cached_property
+  def raw_lines(self):
+    with open(self.raw_path, "r", encoding="utf-8") as rawFile:
+      return rawFile.readlines() * self.scale
+
+  @cached_property
+  def cleaned(self):
+    with open(self.cleaned_path, "r", encoding="utf-8") as cleanedFile:
+      text = cleanedFile.read()
+    glyphs = sorted(set(text) - set(".,\n"))
+    word_pattern = re.compile(r"[^.,\n]+")
+    copies = [text]
+    for copy in range(1, self.scale):
+      rng = random.Random(copy)
+
+      def mutate(m):
+        word = m.group()
+        if rng.random() >= MUTATION_RATE: return word
+        i = rng.randrange(len(word))
+        return word[:i] + rng.choice(glyphs) + word[i + 1:]
+
+      copies.append(word_pattern.sub(mutate, text))
+    return "".join(copies)
+
+  @cached_property
+  def cleaned_file(self):
+    """Path of the scaled cleaned text as a file; the bundled file itself at 1x."""
+    if self.scale == 1: return self.cleaned_path
+    fd, path = tempfile.mkstemp(prefix="vtt_bench_", suffix=".txt")
+    atexit.register(os.remove, path)
+    with os.fdopen(fd, "w", encoding="utf-8") as cleanedFile:
+      cleanedFile.write(self.cleaned)
+    return path
+
+  @cached_property
+  def transliterator(self):
+    return Transliterator.from_file(self.map_path, self.settings)
+
+  @cached_property
+  def output(self):
+    return self.transliterator.transliterate(self.cleaned)
+
+  @cached_property
+  def word_count(self):
+    return sum(1 for _ in self.transliterator.iter_words(self.output))
+
+  @cached_property
+  def stats(self):
+    stats = TextStatistics()
+    stats.add_words(self.transliterator.iter_words(self.output))
+    stats.newlines = self.output.count("\n")
+    return stats
+
+  @cached_property
+  def reference_words(self):
+    """A stand-in reference library: every distinct 1x output word with one character changed."""
+    rng = random.Random(0)
+    alphabet = sorted(set(self.output) - {"\n", self.settings["spaceDelimiter"], self.settings["ambiguousSpaceDelimiter"]})
+    reference = set()
+    with open(self.cleaned_path, "r", encoding="utf-8") as cleanedFile:
+      for word in self.transliterator.split_words(self.transliterator.transliterate(cleanedFile.read())):
+        word = word.lower()
+        i = rng.randrange(len(word))
+        reference.add(word[:i] + rng.choice(alphabet) + word[i + 1:])
+    return sorted(reference)
+
+
+### Stages ###
+# Each stage takes a Workload and returns (run, chars, words): the callable
+# that is timed and the amount of text one run processes (None if not text).
+def stage_clean(w):
+  def run():
+    cleaner = StreamCleaner()
+    index = LocusIndex()
+    cleaned_line = 1
+    for line in w.raw_lines:
+      index.add(line, cleaned_line, None)
+      cleaned_line += cleaner.feed(line).count("\n")
+    cleaner.finish()
+  return run, sum(len(line) for line in w.raw_lines), None
+
+
+def stage_mapping(w):
+  with open(w.map_path, "r", encoding="utf-8") as mapFile:
+    size = len(mapFile.read())
+  return lambda: Transliterator.from_file(w.map_path, w.settings), size, None
+
+
+def stage_read_input(w):
+  """Opens the cleaned file and reads its second half by line number, as main.py reads a startLine/endLine range."""
+  path = w.cleaned_file
+  first_line = w.cleaned.count("\n") // 2 + 1
+
+  def run():
+    with CleanedFile(path) as cleanedFile:
+      return cleanedFile.lines(first_line, -1)
+  return run, len(run()), None
+
+
+def stage_transliterate(w):
+  """One full transliteration, starting from an empty word cache."""
+  cleaned = w.cleaned
+  transliterator = w.transliterator
+
+  def run():
+    transliterator.word_cache.clear()
+    return transliterator.transliterate(cleaned)
+  return run, len(cleaned), w.word_count
+
+
+def stage_transliterate_uncached(w):
+  """The same without the word cache: every word is matched glyph by glyph."""
+  cleaned = w.cleaned
+  transliterator = Transliterator.from_file(w.map_path, w.settings, word_cache_size=0)
+  return lambda: transliterator.transliterate(cleaned), len(cleaned), w.word_count
+
+
+def stage_transliterate_sharded(w):
+  """encode_text() on every core; inputs under PARALLEL_MIN_CHARS stay in-process, as in main.py."""
+  cleaned = w.cleaned
+  transliterator = w.transliterator
+  workers = os.cpu_count() or 1
+
+  def run():
+    transliterator.word_cache.clear()
+    return transliterator.encode_text(cleaned, workers).text()
+  return run, len(cleaned), w.word_count
+
+
+def stage_statistics(w):
+  output = w.output
+
+  def run():
+    stats = TextStatistics()
+    stats.add_words(w.transliterator.iter_words(output))
+    stats.newlines = output.count("\n")
+  return run, len(output), w.word_count
+
+
+def stage_entropy(w):
+  stats = w.stats
+  return lambda: char_entropy(stats.char_counts()), len(w.output), w.word_count
+
+
+def stage_ngrams(w):
+  stats = w.stats
+
+  def run():
+    for n in range(2, 5):
+      stats.ngram_counts(n)
+  return run, len(w.output), w.word_count
+
+
+def stage_sukhotin(w):
+  stats = w.stats
+
+  def run():
+    alphabet, pairs = stats.adjacency()
+    sukhotin_classify(alphabet, pairs)
+  return run, len(w.output), w.word_count
+
+
+def stage_zipf(w):
+  word_counts = w.stats.word_counts
+  return lambda: zipf_fit(word_counts), None, w.word_count
+
+
+def stage_html(w):
+  folder = tempfile.mkdtemp(prefix="vtt_bench_")
+  atexit.register(shutil.rmtree, folder, ignore_errors=True)
+  orig_lines = comparison_lines(w.cleaned.replace(".", w.settings["spaceDelimiter"]).replace(",", w.settings["ambiguousSpaceDelimiter"]), w.settings)
+  trans_lines = comparison_lines(w.output, w.settings)
+  return lambda: write_report(os.path.join(folder, "comparison.html"), trans_lines, orig_lines), len(w.cleaned), w.word_count
+
+
+def stage_translate(w):
+  """Chunks and writes the output through the offline backend: the translation stage's own overhead."""
+  folder = tempfile.mkdtemp(prefix="vtt_bench_")
+  atexit.register(shutil.rmtree, folder, ignore_errors=True)
+  text = w.output.replace(w.settings["spaceDelimiter"], " ").replace(w.settings["ambiguousSpaceDelimiter"], " ")
+  return lambda: translate_text(text, LocalBackend(), "la", "en", os.path.join(folder, "translated.txt")), len(text), w.word_count
+
+
+def stage_fuzzy_index(w):
+  reference = w.reference_words
+  return lambda: FuzzyIndex(reference), sum(map(len, reference)), len(reference)
+
+
+def stage_fuzzy_match(w):
+  """Resolves every distinct unknown word once, as run_corpus_analysis does."""
+  index = FuzzyIndex(w.reference_words)
+  known = set(index.words)
+  queries = [word for word in dict.fromkeys(word.lower() for word in w.stats.word_counts) if len(word) >= 3 and word not in known]
+
+  def run():
+    for word in queries:
+      word_match(index, word, FUZZY_CUTOFF)
+  return run, sum(map(len, queries)), len(queries)
+
+
+def main_stage(options):
+  """A stage that runs main.py itself in a scratch folder, with only the given config options enabled."""
+  def stage(w):
+    folder = tempfile.mkdtemp(prefix="vtt_bench_")
+    atexit.register(shutil.rmtree, folder, ignore_errors=True)
+    cleaned_name, map_name = TRANSCRIPTIONS[w.transcription]
+    with open(os.path.join(folder, cleaned_name), "w", encoding="utf-8") as cleanedFile:
+      cleanedFile.write(w.cleaned)
+    with open(os.path.join(ROOT, map_name), "r", encoding="utf-8") as src, \
+         open(os.path.join(folder, map_name), "w", encoding="utf-8") as dst:
+      dst.write(src.read())
+    os.mkdir(os.path.join(folder, "reference_texts"))
+    with open(os.path.join(folder, "reference_texts", "reference.txt"), "w", encoding="utf-8") as refFile:
+      refFile.write(" ".join(w.reference_words))
+
+    with open(os.path.join(ROOT, "config.json"), "r", encoding="utf-8") as configFile:
+      config = json.load(configFile)
+    config.update({key: False for key in config if key.startswith("enable")})
+    config.update(transliteration=w.transcription, startLine=1, endLine=-1, referenceCachePath="", transliterationCachePath="",
+                  fuzzyWorkers=1)
+    config.update(options)
+    with open(os.path.join(folder, "config.json"), "w", encoding="utf-8") as configFile:
+      json.dump(config, configFile)
+
+    def run():
+      cwd = os.getcwd()
+      argv = sys.argv
+      os.chdir(folder)
+      sys.argv = ["main.py"]
+      try:
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+          runpy.run_path(os.path.join(ROOT, "main.py"), run_name="__main__")
+      finally:
+        sys.argv = argv
+        os.chdir(cwd)
+    return run, len(w.cleaned), w.word_count
+  return stage
+
+
+### Startup Budget ###
+STARTUP_LINES = 20
+STARTUP_BUDGET_MS = 50
+
+
+def startup_check(transcription, repeat):
+  """
+  Times cold `python main.py` runs on the first STARTUP_LINES lines with every
+  feature off, less the start of a bare interpreter. Returns (milliseconds,
+  slowest imports), the imports as (module, ms) from -X importtime.
+  """
+  folder = tempfile.mkdtemp(prefix="vtt_bench_")
+  atexit.register(shutil.rmtree, folder, ignore_errors=True)
+  for name in TRANSCRIPTIONS[transcription]:
+    shutil.copy(os.path.join(ROOT, name), folder)
+  with open(os.path.join(ROOT, "config.json"), "r", encoding="utf-8") as configFile:
+    config = json.load(configFile)
+  config.update({key: False for key in config if key.startswith("enable")})
+  config.update(transliteration=transcription, startLine=1, endLine=STARTUP_LINES, transliterationCachePath="",
+                referenceCachePath="")
+  with open(os.path.join(folder, "config.json"), "w", encoding="utf-8") as configFile:
+    json.dump(config, configFile)
+
+  def run(*args):
+    result = subprocess.run([sys.executable, *args], cwd=folder, capture_output=True, text=True, check=True)
+    return result.stderr
+
+  def timed(*args):
+    start = time.perf_counter()
+    run(*args)
+    return time.perf_counter() - start
+
+  main_path = os.path.join(ROOT, "main.py")
+  run(main_path)  # Writes the bytecode caches
+  # Alternated, so both sides see the same machine load
+  main_times, bare_times = [], []
+  for _ in range(repeat):
+    main_times.append(timed(main_path))
+    bare_times.append(timed("-c", "pass"))
+  milliseconds = (min(main_times) - min(bare_times)) * 1000
+
+  def top_level_imports(stderr):
+    imports = {}
+    for line in stderr.splitlines():
+      fields = line.split("|")
+      if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith("  "):
+        imports[fields[2].strip()] = int(fields[1]) / 1000
+    return imports
+
+  interpreter = top_level_imports(run("-X", "importtime", "-c", "pass"))
+  imports = top_level_imports(run("-X", "importtime", main_path))
+  slowest = sorted(((name, ms) for name, ms in imports.items() if name not in interpreter), key=lambda item: -item[1])
+  return milliseconds, slowest[:5]
+
+
+STAGES = {
+  "clean": stage_clean,
+  "mapping": stage_mapping,
+  "read_input": stage_read_input,
+  "transliterate": stage_transliterate,
+  "transliterate_uncached": stage_transliterate_uncached,
+  "transliterate_sharded": stage_transliterate_sharded,
+  "statistics": stage_statistics,
+  "entropy": stage_entropy,
+  "ngrams": stage_ngrams,
+  "sukhotin": stage_sukhotin,
+  "zipf": stage_zipf,
+  "html": stage_html,
+  "translate": stage_translate,
+  "fuzzy_index": stage_fuzzy_index,
+  "fuzzy_match": stage_fuzzy_match,
+  "main": main_stage({}),
+  "main_analysis": main_stage({"enableAnalysis": True}),
+  "main_html": main_stage({"enableHTMLComparison": True}),
+  "main_fuzzy": main_stage({"enableFuzzyMatching": True}),
+}
+
+
+### Measurement ###
+def measure(stage, transcription, scale, repeat, allocations):
+  """Runs one stage in this process and returns its result row."""
+  w = Workload(transcription, scale)
+  run, chars, words = STAGES[stage](w)
+  setup_rss_kb = peak_rss_kb()
+
+  timings = []
+  started = time.perf_counter()
+  while len(timings) < repeat:
+    start = time.perf_counter()
+    run()
+    timings.append(time.perf_counter() - start)
+    if time.perf_counter() - started >= MIN_TIME: break
+  seconds = min(timings)
+
+  row = {
+    "stage": stage,
+    "transcription": transcription,
+    "scale": scale,
+    "runs": len(timings),
+    "seconds": round(seconds, 6),
+    "chars_per_s": round(chars / seconds) if chars and seconds else None,
+    "words_per_s": round(words / seconds) if words and seconds else None,
+    "setup_rss_kb": setup_rss_kb,
+    "peak_rss_kb": peak_rss_kb(),
+    "alloc_peak_bytes": None,
+    "alloc_blocks": None,
+  }
+  if allocations:
+    tracemalloc.start()
+    run()
+    snapshot = tracemalloc.take_snapshot()
+    row["alloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+    row["alloc_blocks"] = sum(stat.count for stat in snapshot.statistics("filename"))
+    tracemalloc.stop()
+  return row
+
+
+def run_isolated(stage, transcription, scale, repeat, allocations):
+  """Measures a stage in a fresh interpreter so peak RSS only reflects that stage."""
+  command = [sys.executable, os.path.abspath(__file__), "--measure", stage, transcription, str(scale),
+             "--repeat", str(repeat)]
+  if not allocations:
+    command.append("--no-allocations")
+  result = subprocess.run(command, capture_output=True, text=True, cwd=ROOT)
+  if result.returncode != 0:
+    error = (result.stderr.strip().splitlines() or ["exit code " + str(result.returncode)])[-1]
+    return {"stage": stage, "transcription": transcription, "scale": scale, "error": error}
+  return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+### Reporting ###
+def format_rate(value):
+  if value is None: return "-"
+  for unit, size in (("G", 1e9), ("M", 1e6), ("k", 1e3)):
+    if value >= size: return f"{value / size:.2f}{unit}"
+  return str(value)
+
+
+def print_row(row, baseline=None):
+  label = f"{row['stage']:<22} {row['transcription']:<5} x{row['scale']:<4}"
+  if "error" in row:
+    print(f"{label} ERROR: {row['error']}")
+    return
+  line = (f"{label} {row['seconds'] * 1000:>10.2f}ms  {format_rate(row['chars_per_s']):>8} chars/s"
+          f"  {format_rate(row['words_per_s']):>8} words/s  rss {row['peak_rss_kb'] or '-':>8}kB"
+          f" (setup {row['setup_rss_kb'] or '-'}kB)")
+  if row["alloc_peak_bytes"] is not None:
+    line += f"  alloc {row['alloc_peak_bytes'] // 1024}kB/{row['alloc_blocks']} blocks"
+  if baseline and "seconds" in baseline:
+    line += f"  {(row['seconds'] / baseline['seconds'] - 1) * 100:+.1f}%"
+  print(line)
+
+
+def git_commit():
+  try:
+    result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=ROOT)
+  except OSError:
+    return None
+  return result.stdout.strip() or None
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Benchmark each pipeline stage on the bundled and scaled corpora.")
+  parser.add_argument("-s", "--stages", nargs="+", choices=list(STAGES), default=list(STAGES), help="Stages to run (default: all)")
+  parser.add_argument("-t", "--transcriptions", nargs="+", choices=list(TRANSCRIPTIONS), default=["eva"],
+                      help="Transcriptions to run on (default: eva)")
+  parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100], help="Corpus scales (default: 1 10 100)")
+  parser.add_argument("-r", "--repeat", type=int, default=5, help="Most runs per stage; the fastest is kept (default: 5)")
+  parser.add_argument("--no-allocations", action="store_true", help="Skip the extra tracemalloc run of each stage")
+  parser.add_argument("-o", "--output", help="Save the results as a JSON baseline")
+  parser.add_argument("--compare", help="Baseline JSON to compare against")
+  parser.add_argument("--threshold", type=float, default=10.0,
+                      help="Slowdown in percent reported as a regression with --compare (default: 10)")
+  parser.add_argument("--startup-budget", type=float, nargs="?", const=STARTUP_BUDGET_MS, metavar="MS",
+                      help=f"Only check that main.py starts within MS milliseconds on a small line range (default: {STARTUP_BUDGET_MS})")
+  parser.add_argument("--measure", nargs=3, metavar=("STAGE", "TRANSCRIPTION", "SCALE"), help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.measure:
+    stage, transcription, scale = args.measure
+    print(json.dumps(measure(stage, transcription, int(scale), args.repeat, not args.no_allocations)))
+    return
+
+  if args.startup_budget is not None:
+    over = False
+    for transcription in args.transcriptions:
+      milliseconds, slowest = startup_check(transcription, args.repeat)
+      over = over or milliseconds > args.startup_budget
+      print(f"startup        {transcription:<5} {milliseconds:8.1f}ms over the bare interpreter (budget {args.startup_budget:g}ms)")
+      for name, ms in slowest:
+        print(f"    import {name:<20} {ms:7.1f}ms")
+    if over:
+      sys.exit(1)
+    return
+
+  baseline = {}
+  if args.compare:
+    with open(args.compare, "r", encoding="utf-8") as baselineFile:
+      for row in json.load(baselineFile)["results"]:
+        baseline[(row["stage"], row["transcription"], row["scale"])] = row
+
+  results = []
+  regressions = []
+  for transcription in args.transcriptions:
+    for scale in args.scales:
+      for stage in args.stages:
+        row = run_isolated(stage, transcription, scale, args.repeat, not args.no_allocations)
+        results.append(row)
+        previous = baseline.get((stage, transcription, scale))
+        print_row(row, previous)
+        if previous and "seconds" in row and "seconds" in previous:
+          if row["seconds"] > previous["seconds"] * (1 + args.threshold / 100):
+            regressions.append(row)
+
+  if args.output:
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as outputFile:
+      json.dump({
+        "commit": git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "results": results,
+      }, outputFile, indent=2)
+    print(f"\nBaseline: {args.output}")
+
+  if args.compare:
+    print(f"\n{len(regressions)} regression(s) over {args.threshold:g}% against {args.compare}.")
+    if regressions:
+      sys.exit(1)
+
+
+# Run main
+if __name__ == "__main__":
+  main()
@@ -1,38 +1,356 @@
 import re
 import argparse
+import json
+import mmap
+import os
 import sys
+from array import array
+from bisect import bisect_left
 
 
-def clean_transcription(text):
+# Spans are removed one kind at a time, in this order, each from the text the
+# previous kind left, so a span swallows any brackets of later kinds inside it.
+SPANS = (("<", ">"), ("{", "}"), ("[", "]"))
+# Spaces, and the - and = that mark line ends in the transcription
+REMOVED_CHARS = str.maketrans("", "", " =-")
+
+
+class SpanRemover:
+    """
+    Removes every opener...closer span from text fed in pieces, with the same
+    result as re.sub on the whole text. An open span is held back until its
+    closer turns up; one that never closes is kept, along with the rest of
+    the text.
+    """
+
+    def __init__(self, opener, closer):
+        self.opener = opener
+        self.closer = closer
+        self.pending = None
+
+    def feed(self, text):
+        out = []
+        pos = 0
+        while True:
+            if self.pending is not None:
+                end = text.find(self.closer, pos)
+                if end == -1:
+                    self.pending.append(text[pos:])
+                    return "".join(out)
+                self.pending = None
+                pos = end + 1
+            start = text.find(self.opener, pos)
+            if start == -1:
+                out.append(text[pos:])
+                return "".join(out)
+            out.append(text[pos:start])
+            self.pending = [self.opener]
+            pos = start + 1
+
+    def finish(self):
+        """Returns the held back text of a span that never closed."""
+        if self.pending is None:
+            return ""
+        text = "".join(self.pending)
+        self.pending = None
+        return text
+
+
+class StreamCleaner:
+    """
+    Cleans an IVTFF transcription one line at a time with the same result as
+    process_file's whole-file cleaning. Comment lines are skipped, and spans
+    that continue onto later lines are carried over between calls to feed().
+    """
+
+    def __init__(self):
+        self.removers = [SpanRemover(opener, closer) for opener, closer in SPANS]
+
+    def feed(self, line):
+        if line.startswith("#"):
+            return ""
+        for remover in self.removers:
+            line = remover.feed(line)
+        return line.translate(REMOVED_CHARS)
+
+    def finish(self):
+        """Returns what the removers held back for spans that never closed, cleaned by the later removers."""
+        text = ""
+        for remover in self.removers:
+            text = remover.feed(text) + remover.finish()
+        return text.translate(REMOVED_CHARS)
+
+
+# Locus tags at the start of an IVTFF line: <f1r> page headers and
+# <f1r.1,@P0> (EVA) or <1r.1> (v101) text lines.
+LOCUS_PATTERN = re.compile(r"<([^.,>\s]+)(?:\.([^,>\s]+))?[^>]*>")
+PAGE_VARIABLE_PATTERN = re.compile(r"\$(\w)=(\w+)")
+INDEX_VERSION = 1
+
+
+def index_path(cleaned_path):
+    """Side index written next to a cleaned file (example: eva_cleaned_index.json)."""
+    return os.path.splitext(cleaned_path)[0] + "_index.json"
+
+
+class LocusIndex:
+    """
+    Records where every page and locus of the IVTFF input ends up in the
+    cleaned output, as a cleaned line number and byte offset, together with
+    the page variables ($Q quire, $P page, $L Currier language, $H hand...).
+    """
+
+    def __init__(self):
+        self.pages = []
+        self.loci = {}
+
+    def add(self, line, cleaned_line, offset):
+        m = LOCUS_PATTERN.match(line)
+        if not m:
+            return
+        page, locus_line = m.groups()
+        if not self.pages or self.pages[-1]["page"] != page:
+            self.close_page(cleaned_line, offset)
+            self.pages.append({"page": page, "lines": [cleaned_line, None],
+                               "start": offset, "end": None, "variables": {}})
+        if locus_line is None:
+            self.pages[-1]["variables"].update(PAGE_VARIABLE_PATTERN.findall(line))
+        else:
+            self.loci[page + "." + locus_line] = [cleaned_line, offset]
+
+    def close_page(self, next_line, next_offset):
+        if self.pages:
+            self.pages[-1]["lines"][1] = next_line - 1
+            self.pages[-1]["end"] = next_offset
+
+    def fill_offsets(self, cleaned_path):
+        """Computes byte offsets from the line numbers, for cleaned files written before indexing existed."""
+        wanted = {page["lines"][0] for page in self.pages}
+        wanted.update(page["lines"][1] + 1 for page in self.pages)
+        wanted.update(line for line, _ in self.loci.values())
+        offsets = {}
+        offset = 0
+        with open(cleaned_path, "rb") as cleanedFile:
+            for line_number, line in enumerate(cleanedFile, 1):
+                if line_number in wanted:
+                    offsets[line_number] = offset
+                offset += len(line)
+        for page in self.pages:
+            page["start"] = offsets.get(page["lines"][0], offset)
+            page["end"] = offsets.get(page["lines"][1] + 1, offset)
+        for locus in self.loci.values():
+            locus[1] = offsets.get(locus[0], offset)
+
+    def write(self, cleaned_path):
+        index = {"version": INDEX_VERSION,
+                 "file": os.path.basename(cleaned_path),
+                 "size": os.path.getsize(cleaned_path),
+                 "pages": self.pages,
+                 "loci": self.loci}
+        with open(index_path(cleaned_path), "w", encoding="utf-8") as indexFile:
+            json.dump(index, indexFile, ensure_ascii=False, separators=(",", ":"))
+
+
+def load_index(cleaned_path):
+    """Returns the side index of a cleaned file, or None if it is missing or out of date."""
+    try:
+        with open(index_path(cleaned_path), "r", encoding="utf-8") as indexFile:
+            index = json.load(indexFile)
+    except FileNotFoundError:
+        return None
+    if index.get("version") != INDEX_VERSION or index.get("size") != os.path.getsize(cleaned_path):
+        return None
+    return index
+
+
+def folio_key(folio):
+    """Compares folio IDs across transcriptions: "f1r", "1r" and "F1R" are the same folio."""
+    folio = str(folio).lower()
+    if folio.startswith("f") and folio[1:2].isdigit():
+        folio = folio[1:]
+    return folio
+
+
+def select_pages(index, folios=(), quires=(), languages=(), hands=()):
+    """
+    Returns the index entries of the pages matching every non-empty selector,
+    in file order. A page matches a selector if it matches any value in it.
     """
-    - Removes anything between < and >, { and }, and [ and ]
-    - Removes - and = characters
+    folios = {folio_key(f) for f in folios}
+    selectors = [("Q", {str(q) for q in quires}), ("L", {str(l) for l in languages}),
+                 ("H", {str(h) for h in hands})]
+    pages = []
+    for page in index["pages"]:
+        if folios and folio_key(page["page"]) not in folios:
+            continue
+        if any(values and page["variables"].get(name) not in values for name, values in selectors):
+            continue
+        pages.append(page)
+    return pages
+
+
+def line_pages(index, first_line, line_count):
+    """
+    Returns [page, lines] for each page covering the line_count lines that
+    start at first_line, in order. Lines outside every page count towards the
+    page before them (or the first page, before it starts).
+    """
+    last_line = first_line + line_count - 1
+    sections = []
+    line = first_line
+    for page in index["pages"]:
+        page_first, page_last = page["lines"]
+        if page_last < line:
+            continue
+        if page_first > last_line:
+            break
+        page_last = min(page_last, last_line)
+        if sections:
+            sections[-1][1] += max(page_first, line) - line
+            sections.append([page["page"], page_last - max(page_first, line) + 1])
+        else:
+            sections.append([page["page"], page_last - line + 1])
+        line = page_last + 1
+    if not sections:
+        return [[None, line_count]] if line_count else []
+    sections[-1][1] += last_line - line + 1
+    return sections
+
+
+def select_ranges(index, folios=(), quires=(), languages=(), hands=()):
+    """
+    Returns the (start, end) byte ranges of the pages matching every non-empty
+    selector, merged where pages are adjacent.
+    """
+    ranges = []
+    for page in select_pages(index, folios, quires, languages, hands):
+        if ranges and ranges[-1][1] == page["start"]:
+            ranges[-1][1] = page["end"]
+        else:
+            ranges.append([page["start"], page["end"]])
+    return ranges
+
+
+# Newlines are counted per block of this many bytes to find a line's offset
+LINE_BLOCK_SIZE = 1 << 16
+
+
+class CleanedFile:
+    """
+    A cleaned transcription, memory-mapped so that only the text a run selects
+    is ever copied out of it. Line offsets come from a count of the newlines in
+    each LINE_BLOCK_SIZE block, taken once and only as far into the file as a
+    lookup has needed; a line is then found by a binary search over the
+    blocks and a scan of one block.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # An empty file cannot be mapped
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        # Newlines up to the end of each block counted so far
+        self.block_newlines = array("Q")
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def line_offset(self, line):
+        """Byte offset where 0-based line `line` starts, or the file size past the last line."""
+        if line <= 0:
+            return 0
+        counts = self.block_newlines
+        while (not counts or counts[-1] < line) and len(counts) * LINE_BLOCK_SIZE < self.size:
+            start = len(counts) * LINE_BLOCK_SIZE
+            counts.append((counts[-1] if counts else 0) + self.data[start:start + LINE_BLOCK_SIZE].count(b"\n"))
+        # The block holding the newline that ends the line before
+        block = bisect_left(counts, line)
+        if block == len(counts):
+            return self.size
+        offset = block * LINE_BLOCK_SIZE
+        for _ in range(line - (counts[block - 1] if block else 0)):
+            offset = self.data.find(b"\n", offset) + 1
+        return offset
+
+    def read(self, start, end):
+        """Decodes bytes start..end of the file. CRLF and CR line ends are read as newlines, as in text mode."""
+        with memoryview(self.data) as view:
+            text = str(view[start:end], "utf-8")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+        return text
+
+    def lines(self, start_line, end_line):
+        """Text of lines start_line..end_line (1-based, inclusive). end_line -1 reads to the end."""
+        end = self.size if end_line == -1 else self.line_offset(end_line)
+        return self.read(min(self.line_offset(start_line - 1), end), end)
+
+    def ranges(self, ranges):
+        """Text of the (start, end) byte ranges, in order."""
+        return "".join(self.read(start, end) for start, end in ranges)
+
+
+def select_text(cleaned, folios=(), quires=(), languages=(), hands=()):
+    """
+    Reads only the text of the selected pages of a CleanedFile, from their
+    byte ranges in the index. Returns None if the file has no up-to-date index.
     """
+    index = load_index(cleaned.path)
+    if index is None:
+        return None
+    return cleaned.ranges(select_ranges(index, folios, quires, languages, hands))
+
+
+SELECTOR_KEYS = ("selectFolios", "selectQuires", "selectLanguages", "selectHands")
 
-    # Remove everything between < and >
-    text = re.sub(r"<[^>]*>", "", text)
 
-    # Remove everything between { and } (Fixed regex)
-    text = re.sub(r"\{[^}]*\}", "", text)
+def selectors(config):
+    """
+    The folio, quire, language and hand selectors of a config, in the order
+    select_pages and select_text take them.
+    """
+    return tuple(config[key] for key in SELECTOR_KEYS)
 
-    # Remove everything between [ and ] (Fixed regex)
-    text = re.sub(r"\[[^\]]*\]", "", text)
 
-    # Remove - and = characters which typically mark the end of a line in the transcription
-    text = text.replace("=", "")
-    text = text.replace("-", "")
+def warn_empty_selection(config):
+    """
+    Warns that the selectors set in a config match no pages.
+    """
+    chosen = ", ".join(f"{key}={config[key]}" for key in SELECTOR_KEYS if config[key])
+    print(f"[!] WARNING: No pages match {chosen}. Check the selectors against the transcription's page headers.")
 
-    return text
+
+def read_selection(cleaned, config):
+    """
+    Reads the text a config selects from a CleanedFile: the pages matching its
+    selectors if any are set, or else lines startLine to endLine, which are
+    also the fallback when the file has no up-to-date index. Returns the text
+    and whether it was selected by locus.
+    """
+    if any(selectors(config)):
+        text = select_text(cleaned, *selectors(config))
+        if text is not None:
+            if not text:
+                warn_empty_selection(config)
+            return text, True
+        print(f"[!] ERROR: No up-to-date locus index for '{cleaned.path}'. Run cleaner.py to create it.")
+        print("[!] Falling back to startLine/endLine.")
+    # Set endLine to -1 to read the entire file
+    return cleaned.lines(config["startLine"], config["endLine"]), False
 
 
-def process_file(input_path, output_path):
+def process_file(input_path, output_path, index_only=False):
     try:
-        with open(input_path, "r", encoding="utf-8") as file:
-            raw_text = ""
-            for line in file.readlines():
-                if not line.startswith("#"): 
-                    raw_text = raw_text + line
-            raw_text = raw_text.replace(" ", "")
+        inputFile = open(input_path, "r", encoding="utf-8")
     except FileNotFoundError:
         print(f"ERROR: File not found: {input_path}")
         sys.exit(1)
@@ -40,14 +358,48 @@ def process_file(input_path, output_path):
         print(f"ERROR reading file: {e}")
         sys.exit(1)
 
-    cleaned_text = clean_transcription(raw_text)
+    cleaner = StreamCleaner()
+    index = LocusIndex()
+    cleaned_line = 1
+
+    if index_only:
+        # Index an existing cleaned file; its lines must line up with the input's
+        if not os.path.exists(output_path):
+            print(f"ERROR: File not found: {output_path}")
+            sys.exit(1)
+        with inputFile:
+            for line in inputFile:
+                index.add(line, cleaned_line, None)
+                cleaned_line += cleaner.feed(line).count("\n")
+            cleaned_line += cleaner.finish().count("\n")
+        index.close_page(cleaned_line, None)
+        index.fill_offsets(output_path)
+        index.write(output_path)
+        print(f"Index : {index_path(output_path)}\n")
+        return
+
+    offset = 0
 
     try:
-        with open(output_path, "w", encoding="utf-8") as file:
-            file.write(cleaned_text)
+        # Written with "\n" line ends on every platform, so the index's byte offsets match the file
+        with inputFile, open(output_path, "w", encoding="utf-8", newline="\n") as file:
+            # Lines are read through the file's own buffer and written as they are cleaned
+            for line in inputFile:
+                index.add(line, cleaned_line, offset)
+                cleaned = cleaner.feed(line)
+                file.write(cleaned)
+                offset += len(cleaned.encode("utf-8"))
+                cleaned_line += cleaned.count("\n")
+            cleaned = cleaner.finish()
+            file.write(cleaned)
+            offset += len(cleaned.encode("utf-8"))
+            cleaned_line += cleaned.count("\n")
+        index.close_page(cleaned_line, offset)
+        index.write(output_path)
 
         print(f"Input : {input_path}")
-        print(f"Output: {output_path}\n")
+        print(f"Output: {output_path}")
+        print(f"Index : {index_path(output_path)}\n")
 
     except Exception as e:
         print(f"ERROR writing file: {e}")
@@ -61,10 +413,12 @@ def main():
 
     parser.add_argument("input_file", help="Input file (example: v101.txt)")
     parser.add_argument("output_file", help="Output file (example: v101_cleaned.txt)")
+    parser.add_argument("--index-only", action="store_true",
+                        help="Only write the locus index for an existing cleaned output file")
 
     args = parser.parse_args()
 
-    process_file(args.input_file, args.output_file)
+    process_file(args.input_file, args.output_file, args.index_only)
 
 # Run main
 if __name__ == "__main__":
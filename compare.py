@@ -0,0 +1,316 @@
+# The Voynich Transliteration Tool
+# Transcription Comparison
+#
+# Transliterates several transcriptions (EVA and v101 by default) with their
+# own mappings in one run, each in its own worker process, lines the outputs
+# up by locus and reports how far they agree: identical lines, word and
+# character agreement, which output characters stand in for which, and a
+# word diff of every line that differs, next to each transcription's headline
+# statistics. Each transcription is read, tokenized and analysed once; the
+# comparison works on the words the workers hand back.
+#
+# The markers and the folio/quire/language/hand selection come from
+# config.json, and the locus indexes written by cleaner.py are required.
+#
+# Usage:
+#   python compare.py
+#   python compare.py eva v101 -o transcription_comparison.txt --html transcription_comparison.html
+
+### Imports ###
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+from analysis import TextStatistics, summary
+from cleaner import CleanedFile, folio_key, load_index, select_pages, selectors, warn_empty_selection
+from transliterator import DEFAULT_SETTINGS, TRANSCRIPTIONS, WORD_CACHE_SIZE, Transliterator
+
+# Most common substitutes listed per character
+SUBSTITUTES_SHOWN = 3
+
+
+def locus_key(locus):
+  """Compares loci across transcriptions: "f1r.3" and "1r.3" are the same line."""
+  page, _, line = locus.partition(".")
+  return folio_key(page) + "." + line
+
+
+def selected_folios(names, config):
+  """
+  The folio keys of the pages matching config's selectors in any of the
+  transcriptions, or None when nothing is selected. Quires, languages and
+  hands are only in the EVA page headers, so they select the v101 pages of
+  the same folios through EVA.
+  """
+  if not any(selectors(config)): return None
+  folios = set()
+  indexed = False
+  for name in names:
+    index = load_index(TRANSCRIPTIONS[name][0])
+    if index is not None:
+      indexed = True
+      folios.update(folio_key(page["page"]) for page in select_pages(index, *selectors(config)))
+  # Missing indexes are reported by the workers
+  if indexed and not folios:
+    warn_empty_selection(config)
+  return folios
+
+
+### Workers ###
+def transliterate_transcription(task):
+  """
+  Transliterates every locus line of one transcription (of the given folios
+  only, unless folios is None) in one pass. Returns (name, error, the
+  (locus key, output words) of each line in file order, summary() of the
+  output).
+  """
+  name, settings, word_cache_size, folios = task
+  input_path, map_path = TRANSCRIPTIONS[name]
+  index = load_index(input_path)
+  if index is None:
+    return name, f"No up-to-date locus index for '{input_path}'. Run cleaner.py to create it.", None, None
+  try:
+    transliterator = Transliterator.from_file(map_path, settings, word_cache_size=word_cache_size)
+  except (OSError, ValueError) as e:
+    return name, f"Could not read '{map_path}': {e}", None, None
+
+  page_loci = defaultdict(list)
+  for locus, (line, _) in index["loci"].items():
+    page_loci[locus.partition(".")[0]].append((line, locus))
+
+  keys = []
+  lines = []
+  with CleanedFile(input_path) as cleanedFile:
+    # Only the selected pages are read, each in one piece
+    for page in index["pages"]:
+      if folios is not None and folio_key(page["page"]) not in folios: continue
+      page_lines = cleanedFile.read(page["start"], page["end"]).split("\n")
+      first = page["lines"][0]
+      for line, locus in sorted(page_loci[page["page"]]):
+        if 0 <= line - first < len(page_lines):
+          keys.append(locus_key(locus))
+          lines.append(page_lines[line - first] + "\n")
+
+  glyph_text = transliterator.encode_lines(lines)
+  stats = TextStatistics()
+  stats.add_words(glyph_text.words())
+  stats.newlines = len(lines)
+  outputs = glyph_text.text().split("\n")
+  return name, None, [(key, transliterator.split_words(output)) for key, output in zip(keys, outputs)], summary(stats)
+
+
+### Comparison ###
+class Agreement:
+  """
+  How one transcription's output agrees with the reference transcription's
+  over the loci both have. Words are aligned with difflib, and characters
+  are aligned separately with the word breaks removed, so a disputed space
+  does not count against the characters around it.
+  """
+
+  def __init__(self, reference, other):
+    self.reference = reference
+    self.other = other
+    self.lines = 0
+    self.identical_lines = 0
+    self.words = [0, 0]
+    self.matched_words = 0
+    self.chars = [Counter(), Counter()]
+    self.matched_chars = Counter()
+    # (reference character, other character) for characters that differ at the same place
+    self.substitutions = Counter()
+    self.differences = []
+
+  def add(self, key, words, other_words):
+    self.lines += 1
+    self.words[0] += len(words)
+    self.words[1] += len(other_words)
+    chars, other_chars = "".join(words), "".join(other_words)
+    self.chars[0].update(chars)
+    self.chars[1].update(other_chars)
+    if words == other_words:
+      self.identical_lines += 1
+      self.matched_words += len(words)
+      self.matched_chars.update(chars)
+      return
+
+    word_matcher = SequenceMatcher(None, words, other_words, autojunk=False)
+    self.matched_words += sum(block.size for block in word_matcher.get_matching_blocks())
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, chars, other_chars, autojunk=False).get_opcodes():
+      if tag == "equal":
+        self.matched_chars.update(chars[i1:i2])
+      elif tag == "replace" and i2 - i1 == j2 - j1:
+        self.substitutions.update(zip(chars[i1:i2], other_chars[j1:j2]))
+    self.differences.append((key, words, other_words, word_diff(word_matcher)))
+
+  def rate(self, matched, total):
+    return 2 * matched / total if total else 1.0
+
+  def char_rows(self):
+    """(character, reference count, other count, matched, agreement, substitutes) by reference frequency."""
+    counts, other_counts = self.chars
+    substitutes = defaultdict(Counter)
+    for (char, other_char), n in self.substitutions.items():
+      substitutes[char][other_char] += n
+    rows = []
+    for char in sorted(counts.keys() | other_counts.keys(), key=lambda c: (-counts[c], -other_counts[c], c)):
+      matched = self.matched_chars[char]
+      rows.append((char, counts[char], other_counts[char], matched,
+                   self.rate(matched, counts[char] + other_counts[char]),
+                   substitutes[char].most_common(SUBSTITUTES_SHOWN)))
+    return rows
+
+
+def word_diff(matcher):
+  """The aligned words with [-removed-] and {+added+} words marked, as wdiff shows them."""
+  a, b = matcher.a, matcher.b
+  parts = []
+  for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+    if tag == "equal":
+      parts.extend(a[i1:i2])
+      continue
+    if i2 > i1: parts.append("[-" + " ".join(a[i1:i2]) + "-]")
+    if j2 > j1: parts.append("{+" + " ".join(b[j1:j2]) + "+}")
+  return " ".join(parts)
+
+
+def compare(results):
+  """Compares every transcription after the first with the first, in the first's line order."""
+  (reference, _, reference_lines, _), *others = results
+  agreements = []
+  for name, _, lines, _ in others:
+    agreement = Agreement(reference, name)
+    other_lines = dict(lines)
+    for key, words in reference_lines:
+      if key in other_lines:
+        agreement.add(key, words, other_lines[key])
+    agreements.append(agreement)
+  return agreements
+
+
+### Report ###
+def format_value(value):
+  if value is None: return "-"
+  if isinstance(value, float): return f"{value:.4f}"
+  return str(value)
+
+
+def write_report(path, results, agreements, folios):
+  names = [name for name, *_ in results]
+  with open(path, "w", encoding="utf-8") as reportFile:
+    reportFile.write(f"=== TRANSCRIPTION COMPARISON: {' vs '.join(names)} ===\n")
+    reportFile.write("Pages: " + ("all" if folios is None else ", ".join(sorted(folios))) + "\n")
+    reportFile.write("Loci: " + ", ".join(f"{name} {len(lines)}" for name, _, lines, _ in results) + "\n\n")
+
+    reportFile.write("=== STATISTICS ===\n")
+    reportFile.write(f"{'':<16}" + "".join(f"{name:>14}" for name in names) + "\n")
+    for field in ("chars", "words", "distinct_words", "entropy", "zipf_exponent", "zipf_r2"):
+      reportFile.write(f"{field:<16}" + "".join(f"{format_value(stats[field]):>14}" for *_, stats in results) + "\n")
+    # Too long for a column
+    for name, _, _, stats in results:
+      reportFile.write(f"vowels ({name}): {stats['vowels']}\n")
+
+    for agreement in agreements:
+      reference, other = agreement.reference, agreement.other
+      matched_chars = sum(agreement.matched_chars.values())
+      total_chars = sum(agreement.chars[0].values()) + sum(agreement.chars[1].values())
+      reportFile.write(f"\n=== {reference} vs {other} ===\n")
+      reportFile.write(f"Shared loci: {agreement.lines}\n")
+      if agreement.lines:
+        reportFile.write(f"Identical lines: {agreement.identical_lines} ({agreement.identical_lines / agreement.lines:.2%})\n")
+      reportFile.write(f"Word agreement: {agreement.rate(agreement.matched_words, sum(agreement.words)):.2%} "
+                       f"({agreement.words[0]} vs {agreement.words[1]} words)\n")
+      reportFile.write(f"Character agreement: {agreement.rate(matched_chars, total_chars):.2%}\n")
+
+      reportFile.write(f"\n--- Per-character agreement ({reference} -> {other}) ---\n")
+      reportFile.write(f"{'char':>6} {reference:>9} {other:>9} {'matched':>9} {'agree':>8}  substitutes\n")
+      for char, count, other_count, matched, rate, substitutes in agreement.char_rows():
+        listed = ", ".join(f"{sub!r} {n}" for sub, n in substitutes)
+        reportFile.write(f"{char!r:>6} {count:>9} {other_count:>9} {matched:>9} {rate:>8.2%}  {listed}\n")
+
+      reportFile.write(f"\n--- Differing lines ({len(agreement.differences)}) ---\n")
+      for key, words, other_words, diff in agreement.differences:
+        reportFile.write(f"<{key}>\n")
+        reportFile.write(f"  {reference:<6} {' '.join(words)}\n")
+        reportFile.write(f"  {other:<6} {' '.join(other_words)}\n")
+        reportFile.write(f"  {'diff':<6} {diff}\n")
+
+
+def write_html(path, results, agreements):
+  """One side-by-side page per compared transcription, with a row per shared locus."""
+  from report import write_report as write_html_report
+  reference_name, _, reference_lines, _ = results[0]
+  for agreement, (name, _, lines, _) in zip(agreements, results[1:]):
+    other_lines = dict(lines)
+    keys = [key for key, _ in reference_lines if key in other_lines]
+    reference_words = dict(reference_lines)
+    page_path = path if len(agreements) == 1 else f"{os.path.splitext(path)[0]}_{name}.html"
+    write_html_report(page_path,
+                      [f"{key}  {' '.join(reference_words[key])}" for key in keys],
+                      [" ".join(other_lines[key]) for key in keys],
+                      title=f"Transliterations: {reference_name} vs {name}")
+    print(f"HTML comparison: {page_path}")
+
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="Transliterate several transcriptions with their own mappings and compare them line by line."
+  )
+  parser.add_argument("transcriptions", nargs="*", default=["eva", "v101"],
+                      help=f"Transcriptions to compare ({', '.join(TRANSCRIPTIONS)}); the first is the reference (default: eva v101)")
+  parser.add_argument("-o", "--output", default="transcription_comparison.txt", help="Report file")
+  parser.add_argument("--html", metavar="PATH", help="Also write a side-by-side HTML comparison to PATH")
+  parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                      help="Worker processes, one transcription each (default: all cores)")
+  parser.add_argument("-c", "--config", default="config.json", help="Config file for the markers and page selection")
+  args = parser.parse_args()
+
+  names = list(dict.fromkeys(args.transcriptions))
+  unknown = [name for name in names if name not in TRANSCRIPTIONS]
+  if unknown:
+    print(f"ERROR: Unknown transcription: {', '.join(unknown)} (expected: {', '.join(TRANSCRIPTIONS)})")
+    sys.exit(1)
+  if len(names) < 2:
+    print("ERROR: Name at least two different transcriptions to compare.")
+    sys.exit(1)
+  with open(args.config, "r", encoding="utf-8") as configFile:
+    config = json.load(configFile)
+  settings = {k: config.get(k, v) for k, v in DEFAULT_SETTINGS.items()}
+  folios = selected_folios(names, config)
+  tasks = [(name, settings, config.get("wordCacheSize", WORD_CACHE_SIZE), folios) for name in names]
+
+  start = time.perf_counter()
+  workers = min(args.workers, len(names))
+  if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+    with multiprocessing.get_context("fork").Pool(workers) as pool:
+      results = pool.map(transliterate_transcription, tasks)
+  else:
+    results = [transliterate_transcription(task) for task in tasks]
+  errors = [(name, error) for name, error, *_ in results if error]
+  if errors:
+    for name, error in errors:
+      print(f"[!] ERROR: {name}: {error}")
+    sys.exit(1)
+
+  agreements = compare(results)
+  shared = set.intersection(*({key for key, _ in lines} for _, _, lines, _ in results))
+  write_report(args.output, results, agreements, folios)
+  if args.html:
+    write_html(args.html, results, agreements)
+  elapsed = time.perf_counter() - start
+
+  for agreement in agreements:
+    print(f"{agreement.reference} vs {agreement.other}: {agreement.identical_lines} of {agreement.lines} shared lines identical, "
+          f"word agreement {agreement.rate(agreement.matched_words, sum(agreement.words)):.2%}.")
+  print(f"Compared {len(names)} transcriptions ({len(shared)} loci in all) in {elapsed:.2f}s.")
+  print(f"Report: {args.output}")
+
+
+# Run main
+if __name__ == "__main__":
+  main()
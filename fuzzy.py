@@ -0,0 +1,330 @@
+# The Voynich Transliteration Tool
+# Fuzzy Dictionary Matching
+#
+# An index over the reference vocabulary that returns the same result as
+# difflib.get_close_matches(word, vocabulary, n=1, cutoff=cutoff) without
+# running a SequenceMatcher against every reference word.
+
+### Imports ###
+import difflib
+import json
+import mmap
+import multiprocessing
+import os
+import struct
+from array import array
+from collections import Counter
+from itertools import chain
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+class FuzzyIndex:
+    """
+    Reference words grouped by length, with the character counts of each word.
+
+    difflib's ratio() can never exceed quick_ratio(), which only depends on
+    how many characters (with repeats) two words share, and never exceeds
+    real_quick_ratio(), which only depends on their lengths. For a query, the
+    index computes the exact quick_ratio() of every word of a feasible length
+    and only scores the words whose bound reaches the cutoff, best bound
+    first, stopping as soon as no remaining bound can beat the best ratio.
+
+    With NumPy, each length keeps a words x characters count matrix and the
+    shared counts of a whole length are one vectorized minimum/sum. Without
+    it, each word is posted under (char, k) for every k-th copy of a char it
+    contains and the shared counts are tallied over the query's postings.
+    """
+
+    def __init__(self, words, lengths=None, columns=None, mapping=None):
+        self.words = list(words)
+        # Lookups made, words whose bound reached the cutoff, and ratios computed
+        self.queries = 0
+        self.candidates = 0
+        self.scored = 0
+        # The memory-mapped cache file the prebuilt matrices are views of
+        self.mapping = mapping
+        if lengths is not None:
+            # Prebuilt from a reference cache
+            self.lengths = lengths
+            self.columns = columns
+            return
+
+        by_length = {}
+        for word_id, word in enumerate(self.words):
+            by_length.setdefault(len(word), array("I")).append(word_id)
+
+        self.lengths = {}
+        if np is not None:
+            chars = sorted(set(chain.from_iterable(self.words)))
+            self.columns = {c: i for i, c in enumerate(chars)}
+            codepoints = np.array([ord(c) for c in chars], dtype=np.uint32)
+            for length, word_ids in by_length.items():
+                if length == 0: continue
+                ids = np.frombuffer(word_ids, dtype=np.uint32)
+                text = "".join(self.words[i] for i in word_ids).encode("utf-32-le")
+                columns = np.searchsorted(codepoints, np.frombuffer(text, dtype=np.uint32))
+                rows = np.repeat(np.arange(len(ids)), length)
+                counts = np.bincount(rows * len(chars) + columns, minlength=len(ids) * len(chars))
+                self.lengths[length] = (ids, counts.reshape(len(ids), len(chars)).astype(np.uint16))
+        else:
+            for length, word_ids in by_length.items():
+                postings = {}
+                for word_id in word_ids:
+                    for c, count in Counter(self.words[word_id]).items():
+                        for k in range(1, count + 1):
+                            postings.setdefault((c, k), array("I")).append(word_id)
+                self.lengths[length] = postings
+
+    def detach(self):
+        """
+        Copies matrices that are views of a memory-mapped cache into memory and
+        closes the mapping, so the cache file can be replaced (Windows refuses
+        to replace a file that is still mapped).
+        """
+        if self.mapping is None:
+            return
+        self.lengths = {length: (ids.copy(), counts.copy()) for length, (ids, counts) in self.lengths.items()}
+        self.mapping.close()
+        self.mapping = None
+
+    def __len__(self):
+        return len(self.words)
+
+    def stats(self):
+        """Returns the lookups made, the candidates that passed the bounds and the ratios computed."""
+        return {"queries": self.queries, "candidates": self.candidates, "scored": self.scored}
+
+    def shared_counts(self, length, query_counts, need):
+        """Yields (word_id, shared) for words of this length sharing at least `need` characters with the query."""
+        if np is not None:
+            chars = [c for c in query_counts if c in self.columns]
+            if not chars: return
+            ids, counts = self.lengths[length]
+            limits = np.array([query_counts[c] for c in chars], dtype=np.uint16)
+            shared = np.minimum(counts[:, [self.columns[c] for c in chars]], limits).sum(axis=1)
+            for row in np.flatnonzero(shared >= need):
+                yield int(ids[row]), int(shared[row])
+        else:
+            postings = self.lengths[length]
+            keys = [(c, k) for c, count in query_counts.items() for k in range(1, count + 1)]
+            shared = Counter(chain.from_iterable(postings.get(key, ()) for key in keys))
+            for word_id, common in shared.items():
+                if common >= need:
+                    yield word_id, common
+
+    def best_match(self, word, cutoff):
+        """
+        Returns (ratio, match) for the reference word difflib.get_close_matches
+        would return first, or None. Ratios are SequenceMatcher(None, match,
+        word).ratio(), and ties go to the greater word, as in difflib.
+        """
+        la = len(word)
+        if la == 0 or cutoff <= 0:
+            matches = difflib.get_close_matches(word, self.words, n=1, cutoff=cutoff)
+            if not matches: return None
+            return difflib.SequenceMatcher(None, matches[0], word).ratio(), matches[0]
+
+        query_counts = Counter(word)
+        candidates = []
+        for lb in self.lengths:
+            total = la + lb
+            # real_quick_ratio() bound: the lengths alone must allow the cutoff
+            if 2.0 * min(la, lb) / total < cutoff: continue
+            # Fewest shared characters whose quick_ratio() reaches the cutoff,
+            # found with difflib's own float formula so no word is lost to rounding
+            need = max(int(cutoff * total / 2) - 1, 1)
+            while 2.0 * need / total < cutoff:
+                need += 1
+            if need > la: continue
+            for word_id, common in self.shared_counts(lb, query_counts, need):
+                candidates.append((2.0 * common / total, word_id))
+        candidates.sort(reverse=True)
+        self.queries += 1
+        self.candidates += len(candidates)
+
+        s = difflib.SequenceMatcher()
+        s.set_seq2(word)
+        best = None
+        for bound, word_id in candidates:
+            if best is not None and bound < best[0]: break
+            candidate = self.words[word_id]
+            s.set_seq1(candidate)
+            ratio = s.ratio()
+            self.scored += 1
+            if ratio >= cutoff and (best is None or (ratio, candidate) > best):
+                best = (ratio, candidate)
+        return best
+
+
+### Match Resolution ###
+def is_valid_merge(original, match):
+    """Ensures the merge isn't just a wild guess."""
+    common = Counter(original) & Counter(match)
+    overlap = sum(common.values())
+    return (overlap / len(match)) >= 0.80
+
+
+def word_match(index, word, cutoff):
+    """Returns (match, score) for a word the dictionary does not know, (None, 0) if nothing is close enough."""
+    match = index.best_match(word, cutoff)
+    if not match: return None, 0
+    return match[1], round(difflib.SequenceMatcher(None, word, match[1]).ratio() * 100)
+
+
+def merge_match(index, candidate, cutoff):
+    """Returns (match, score) for two joined words, (None, 0) if no plausible match exists."""
+    match = index.best_match(candidate, cutoff)
+    if not match or not is_valid_merge(candidate, match[1]): return None, 0
+    return match[1], round(difflib.SequenceMatcher(None, candidate, match[1]).ratio() * 100)
+
+
+# Fewer lookups than this are resolved in-process; a pool would cost more than it saves
+PARALLEL_MIN_LOOKUPS = 256
+
+worker_index = None
+
+def init_worker(index):
+    global worker_index
+    worker_index = index
+
+
+def resolve_word(job):
+    return word_match(worker_index, *job)
+
+
+def resolve_merge(job):
+    return merge_match(worker_index, *job)
+
+
+def resolve_matches(index, jobs, resolve, workers):
+    """
+    Returns the result of resolve for every (query, cutoff) job, in job order.
+    Workers are forked so they share the index instead of receiving a copy;
+    where fork is unavailable, or for few jobs, everything runs in-process.
+    """
+    jobs = list(jobs)
+    if workers <= 1 or len(jobs) < PARALLEL_MIN_LOOKUPS or "fork" not in multiprocessing.get_all_start_methods():
+        init_worker(index)
+        return [resolve(job) for job in jobs]
+    context = multiprocessing.get_context("fork")
+    chunksize = max(1, len(jobs) // (workers * 8))
+    with context.Pool(workers, initializer=init_worker, initargs=(index,)) as pool:
+        return pool.map(resolve, jobs, chunksize=chunksize)
+
+
+### Reference Cache ###
+# Layout: CACHE_MAGIC, a little-endian uint32 header length, a JSON header
+# padded to a multiple of 8 bytes, then the 8-byte aligned sections the header
+# points to by offset from the end of the header: the words
+# ("\n"-joined UTF-8), each length's word ids (uint32) and character count
+# matrix (uint16, NumPy only), and the stored match results (JSON).
+CACHE_MAGIC = b"VTTFUZZY"
+CACHE_VERSION = 1
+
+
+def reference_signature(folder, filenames):
+    """[name, size, mtime_ns] of every reference file, the key a cache is valid for."""
+    signature = []
+    for filename in sorted(filenames):
+        st = os.stat(os.path.join(folder, filename))
+        signature.append([filename, st.st_size, st.st_mtime_ns])
+    return signature
+
+
+def load_cache(cache_path, signature):
+    """
+    Returns (index, matches) from a cache built for these reference files, or
+    None when the cache is missing, from another version or out of date. The
+    count matrices are NumPy views of the memory-mapped file, not copies.
+    """
+    try:
+        with open(cache_path, "rb") as cacheFile:
+            data = mmap.mmap(cacheFile.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        if data[:len(CACHE_MAGIC)] != CACHE_MAGIC:
+            data.close()
+            return None
+        (header_len,) = struct.unpack_from("<I", data, len(CACHE_MAGIC))
+        start = len(CACHE_MAGIC) + 4
+        header = json.loads(data[start:start + header_len].decode("utf-8"))
+        if header.get("version") != CACHE_VERSION or header.get("references") != signature:
+            data.close()
+            return None
+        base = start + header_len
+
+        def section(name):
+            offset, size = header[name]
+            return data[base + offset:base + offset + size]
+
+        words = section("words").decode("utf-8").split("\n")
+        matches = json.loads(section("matches").decode("utf-8"))
+        if np is None or header["columns"] is None:
+            # Nothing refers to the file any more
+            data.close()
+            return FuzzyIndex(words), matches
+
+        lengths = {}
+        for length, (ids_offset, rows, counts_offset) in header["lengths"].items():
+            ids = np.frombuffer(data, dtype=np.uint32, count=rows, offset=base + ids_offset)
+            counts = np.frombuffer(data, dtype=np.uint16, count=rows * len(header["columns"]), offset=base + counts_offset)
+            lengths[int(length)] = (ids, counts.reshape(rows, len(header["columns"])))
+        columns = {c: i for i, c in enumerate(header["columns"])}
+        return FuzzyIndex(words, lengths, columns, data), matches
+    except (KeyError, TypeError, ValueError, struct.error):
+        # Views made before the error may still hold the mapping; it closes once they are gone
+        return None
+
+
+def write_cache(cache_path, signature, index, matches):
+    """
+    Writes the index and match results for these reference files, replacing
+    any older cache. An index loaded from that cache is detached from it first.
+    """
+    index.detach()
+    sections = []
+    offset = 0
+
+    def add(payload):
+        nonlocal offset
+        offset += -offset % 8
+        sections.append((offset, payload))
+        position = [offset, len(payload)]
+        offset += len(payload)
+        return position
+
+    header = {"version": CACHE_VERSION, "references": signature, "columns": None, "lengths": {}}
+    header["words"] = add("\n".join(index.words).encode("utf-8"))
+    if np is not None:
+        header["columns"] = "".join(sorted(index.columns, key=index.columns.get))
+        for length, (ids, counts) in index.lengths.items():
+            ids_offset, _ = add(np.ascontiguousarray(ids, dtype=np.uint32).tobytes())
+            counts_offset, _ = add(np.ascontiguousarray(counts, dtype=np.uint16).tobytes())
+            header["lengths"][str(length)] = [ids_offset, len(ids), counts_offset]
+    header["matches"] = add(json.dumps(matches, ensure_ascii=False).encode("utf-8"))
+
+    encoded = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = len(CACHE_MAGIC) + 4 + len(encoded)
+    encoded += b" " * (-data_start % 8)
+
+    temp_path = cache_path + ".tmp"
+    with open(temp_path, "wb") as cacheFile:
+        cacheFile.write(CACHE_MAGIC)
+        cacheFile.write(struct.pack("<I", len(encoded)))
+        cacheFile.write(encoded)
+        position = 0
+        for section_offset, payload in sections:
+            cacheFile.write(b"\0" * (section_offset - position))
+            cacheFile.write(payload)
+            position = section_offset + len(payload)
+    try:
+        os.replace(temp_path, cache_path)
+    except OSError:
+        os.remove(temp_path)
+        raise
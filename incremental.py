@@ -0,0 +1,180 @@
+# The Voynich Transliteration Tool
+# Incremental Transliteration
+#
+# Keeps the output of every input line from the previous run, so a mapping
+# edit only re-transliterates the lines that contain a changed glyph, and
+# updates the analysis counters with the difference those lines make.
+
+### Imports ###
+import hashlib
+import json
+import os
+import re
+from collections import Counter
+
+from analysis import TextStatistics
+from transliterator import DEFAULT_SETTINGS
+
+CACHE_VERSION = 1
+
+
+def changed_glyphs(old_mapping, new_mapping):
+  """Glyphs that were added, removed or given a different value."""
+  return [glyph for glyph in set(old_mapping) | set(new_mapping) if old_mapping.get(glyph) != new_mapping.get(glyph)]
+
+
+class TransliterationCache:
+  """
+  Transliterated output of each distinct input line, for the mapping it was
+  made with. Lines are independent (words never span a newline), and a
+  line's output only depends on the mapping entries whose glyphs occur in
+  it: tokenizing never completes a glyph that does not occur. So when the
+  mapping changes, only the cached lines containing an added, removed or
+  edited glyph are dropped. Only the lines of the last run are kept, so the
+  cache does not grow as the selection or transcription changes.
+
+  The analysis counters of the last selection are kept too. When the same
+  lines are selected again, they are updated by removing the old output of
+  each re-transliterated line and adding the new one.
+  """
+
+  def __init__(self, cache_path, mapping, settings):
+    self.cache_path = cache_path
+    self.mapping = mapping
+    self.settings = {k: settings[k] for k in DEFAULT_SETTINGS}
+    self.lines = {}
+    self.stale = {}
+    self.selection = None
+    self.stats = None
+    self.counted = False
+    self.reused = 0
+    self.invalidated = 0
+    # Whether the file needs rewriting; an intact cache that this run added nothing to does not
+    self.changed = True
+    self.load()
+
+  def load(self):
+    if not self.cache_path or not os.path.exists(self.cache_path): return
+    try:
+      with open(self.cache_path, "r", encoding="utf-8") as cacheFile:
+        cache = json.load(cacheFile)
+    except (OSError, ValueError):
+      return
+    if cache.get("version") != CACHE_VERSION or cache.get("settings") != self.settings: return
+
+    self.lines = cache["lines"]
+    changed = changed_glyphs(cache["mapping"], self.mapping)
+    if changed:
+      pattern = re.compile("|".join(re.escape(glyph) for glyph in sorted(changed, key=len, reverse=True)))
+      self.stale = {line: output for line, output in self.lines.items() if pattern.search(line)}
+      for line in self.stale:
+        del self.lines[line]
+      self.invalidated = len(self.stale)
+
+    self.selection = cache["selection"]
+    self.changed = bool(self.stale)
+    if cache["stats"] is not None:
+      self.stats = TextStatistics()
+      self.stats.word_counts = Counter(dict(cache["stats"]["word_counts"]))
+      self.stats.reduplications = Counter(dict(cache["stats"]["reduplications"]))
+      self.stats.boundary_pairs = Counter({(a, b): n for a, b, n in cache["stats"]["boundary_pairs"]})
+      self.stats.newlines = cache["stats"]["newlines"]
+
+  def transliterate(self, selected_lines, transliterator, workers=1):
+    """
+    Returns the output of every selected line, reusing cached lines and
+    transliterating the rest (across `workers` processes when there are
+    many). Records which lines were redone.
+    """
+    self.input_lines = selected_lines
+    missing = [line for line in dict.fromkeys(selected_lines) if line not in self.lines]
+    self.lines.update(zip(missing, transliterator.transliterate_lines(missing, workers)))
+    kept = {line: self.lines[line] for line in dict.fromkeys(selected_lines)}
+    if missing or len(kept) < len(self.lines):
+      self.changed = True
+    self.lines = kept
+    computed = set(missing)
+    self.output_lines = [self.lines[line] for line in selected_lines]
+    self.reused = len(selected_lines) - len(missing)
+    # Every copy of a redone line changed, not just the first one
+    self.redone = [i for i, line in enumerate(selected_lines) if line in computed]
+    return "".join(self.output_lines)
+
+  def statistics(self, transliterator, output):
+    """
+    Returns the TextStatistics of the output. Updated from the previous
+    run's counters when the same lines were selected, otherwise counted
+    from scratch.
+    """
+    selection = hashlib.sha1("".join(self.input_lines).encode("utf-8")).hexdigest()
+    stats = self.stats
+    # Past a quarter of the lines, replacing them costs more than counting everything
+    if (stats is None or selection != self.selection or len(self.redone) * 4 > len(self.input_lines)
+        or any(self.input_lines[i] not in self.stale for i in self.redone)):
+      stats = TextStatistics()
+      stats.add_words(transliterator.iter_words(output))
+      stats.newlines = output.count("\n")
+    else:
+      line_words = [None] * len(self.output_lines)
+
+      def words_of(i):
+        if line_words[i] is None:
+          line_words[i] = transliterator.split_words(current[i])
+        return line_words[i]
+
+      def before(i):
+        word = None
+        for j in range(i - 1, -1, -1):
+          for w in reversed(words_of(j)):
+            if word is None: word = w
+            edge = stats.edge(w)
+            if edge is not None: return word, edge[1]
+        return word, None
+
+      def after(i):
+        word = None
+        for j in range(i + 1, len(current)):
+          for w in words_of(j):
+            if word is None: word = w
+            edge = stats.edge(w)
+            if edge is not None: return word, edge[0]
+        return word, None
+
+      # Replace each redone line's words in text order; lines after it still hold their old output
+      current = [self.stale.get(line, output) for line, output in zip(self.input_lines, self.output_lines)]
+      for i in self.redone:
+        context = (before(i), after(i))
+        stats.add_segment(words_of(i), *context, sign=-1)
+        current[i] = self.output_lines[i]
+        line_words[i] = None
+        stats.add_segment(words_of(i), *context)
+      stats.prune()
+      stats.reorder(transliterator.split_words(output))
+
+    if stats is not self.stats or selection != self.selection:
+      self.changed = True
+    self.selection = selection
+    self.stats = stats
+    self.counted = True
+    return stats
+
+  def write(self):
+    if not self.cache_path or not self.changed: return
+    # Counters not brought up to date this run would not match the cached lines
+    stats = None
+    if self.counted:
+      stats = {
+        "word_counts": list(self.stats.word_counts.items()),
+        "reduplications": list(self.stats.reduplications.items()),
+        "boundary_pairs": [[a, b, n] for (a, b), n in self.stats.boundary_pairs.items()],
+        "newlines": self.stats.newlines,
+      }
+    with open(self.cache_path, "w", encoding="utf-8") as cacheFile:
+      json.dump({
+        "version": CACHE_VERSION,
+        "settings": self.settings,
+        "mapping": self.mapping,
+        "selection": self.selection,
+        "lines": self.lines,
+        "stats": stats,
+      }, cacheFile, ensure_ascii=False)
@@ -0,0 +1,118 @@
+# The Voynich Transliteration Tool
+# Instrumentation
+#
+# Opt-in per-stage timing for main.py. Each stage records its wall time, CPU
+# time and the process's peak memory, and can be profiled with cProfile.
+# Disabled instrumentation does no work beyond a function call per stage, and
+# the profiler and tracemalloc are only imported when they are switched on.
+
+### Imports ###
+import json
+import os
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+try:
+  import resource
+except ImportError:
+  resource = None
+
+METRICS_VERSION = 1
+
+
+def peak_rss_kb():
+  """Peak resident memory of this process so far, or None where the resource module is unavailable."""
+  if resource is None: return None
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # Bytes on macOS, kilobytes elsewhere
+  return peak // 1024 if sys.platform == "darwin" else peak
+
+
+class Metrics:
+  """
+  Collects one record per pipeline stage plus named counters and values,
+  and writes them to a JSON metrics file. With trace_memory, each stage also records
+  the peak of Python allocations made while it ran (tracemalloc, which slows
+  the run down). With profile_folder, each stage is run under cProfile and
+  dumped to <profile_folder>/<stage>.pstats.
+  """
+
+  def __init__(self, enabled=False, trace_memory=False, profile_folder=None):
+    self.enabled = enabled
+    self.trace_memory = enabled and trace_memory
+    self.profile_folder = profile_folder if enabled else None
+    self.stages = []
+    self.counters = Counter()
+    self.values = {}
+    self.started = time.time()
+
+  @contextmanager
+  def stage(self, name):
+    if not self.enabled:
+      yield
+      return
+
+    profiler = None
+    if self.profile_folder:
+      import cProfile
+      profiler = cProfile.Profile()
+    if self.trace_memory:
+      import tracemalloc
+      if not tracemalloc.is_tracing():
+        tracemalloc.start()
+      tracemalloc.reset_peak()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if profiler: profiler.enable()
+    try:
+      yield
+    finally:
+      if profiler: profiler.disable()
+      record = {
+        "stage": name,
+        "wall_s": round(time.perf_counter() - wall, 6),
+        "cpu_s": round(time.process_time() - cpu, 6),
+        "peak_rss_kb": peak_rss_kb(),
+      }
+      if self.trace_memory:
+        record["alloc_peak_bytes"] = tracemalloc.get_traced_memory()[1]
+      if profiler:
+        os.makedirs(self.profile_folder, exist_ok=True)
+        record["profile"] = os.path.join(self.profile_folder, f"{name}.pstats")
+        profiler.dump_stats(record["profile"])
+      self.stages.append(record)
+
+  def count(self, name, n=1):
+    if self.enabled:
+      self.counters[name] += n
+
+  def update(self, prefix, counts):
+    """Adds every entry of a dict of counts as <prefix>.<key>."""
+    if self.enabled:
+      for key, n in counts.items():
+        self.counters[f"{prefix}.{key}"] += n
+
+  def value(self, name, value):
+    """Records a measured value, such as a fitted parameter, under name."""
+    if self.enabled:
+      self.values[name] = value
+
+  def write(self, path, config=None):
+    if not self.enabled: return
+    if self.trace_memory:
+      import tracemalloc
+      tracemalloc.stop()
+    import platform
+    with open(path, "w", encoding="utf-8") as metricsFile:
+      json.dump({
+        "version": METRICS_VERSION,
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+        "python": platform.python_version(),
+        "config": config or {},
+        "total_wall_s": round(time.time() - self.started, 6),
+        "stages": self.stages,
+        "counters": dict(sorted(self.counters.items())),
+        "values": dict(sorted(self.values.items())),
+      }, metricsFile, indent=2, ensure_ascii=False)
@@ -6,347 +6,132 @@
 # Read the README.md file for a full explanation of all features.
 
 ### Imports ###
-import math
+import argparse
 import os
-import difflib
 from collections import Counter
-from functools import lru_cache
 import json
 
+from cleaner import CleanedFile, read_selection
+from instrumentation import Metrics
+from transliterator import TRANSCRIPTIONS, Transliterator, count_lines, glyph_inventory, split_lines
+# OPTIMIZATION: Each feature's modules (and NumPy, matplotlib, deep_translator) are imported in its block below,
+# so a run only pays for the features it has switched on
+
 config = None
 
 with open("config.json", "r", encoding="utf-8") as configFile:
    config = json.load(configFile)
 
-# Read Input
-if config["transliteration"] == "v101":
-   inputPath = "v101_cleaned.txt"
-   mapPath = "v101_mapping.json"
-elif config["transliteration"] == "eva":
-   inputPath = "eva_cleaned.txt"
-   mapPath = "eva_mapping.json"
-
-with open(inputPath, "r", encoding="utf-8") as inputFile:
-  all_lines = inputFile.readlines()
-  if config["endLine"] == -1: # Set endLine to -1 to parse the entire v101 or eva file
-    selected_lines = all_lines[config["startLine"]-1:]
-  else:
-    selected_lines = all_lines[config["startLine"]-1:config["endLine"]]
-
-  if config["endLine"] == -1:
-    print(f"Processing lines {config["startLine"]-1} to {len(selected_lines)}...")
-  else:
-    print(f"Processed {len(selected_lines)} lines...")
-  inputData = "".join(selected_lines)
-  inputData = inputData.replace(".", config["spaceDelimiter"])
-  inputData = inputData.replace(",", config["ambiguousSpaceDelimiter"])
-
-# Outputs
-outputFile = open(config["outputPath"], "w", encoding="utf-8")
-
-# Dictionaries
-num_to_char_normal = {}
-num_to_char_final = {}
-char_to_num_normal = {}
-char_to_num_final = {}
-input_num_to_char_normal = {}
-input_num_to_char_final = {}
-input_char_to_num_normal = {}
-input_char_to_num_final = {}
-
-num_to_char_initial = {}
-char_to_num_initial = {}
-input_num_to_char_initial = {}
-input_char_to_num_initial = {}
-
-num_to_char_first = {}
-char_to_num_first = {}
-input_num_to_char_first = {}
-input_char_to_num_first = {}
-
-num_to_char_second = {}
-char_to_num_second = {}
-input_num_to_char_second = {}
-input_char_to_num_second = {}
-
-num_to_char_third = {}
-char_to_num_third = {}
-input_num_to_char_third = {}
-input_char_to_num_third = {}
-
-num_to_char_fourth = {}
-char_to_num_fourth = {}
-input_num_to_char_fourth = {}
-input_char_to_num_fourth = {}
+# Command line switches for the instrumentation settings in config.json
+parser = argparse.ArgumentParser(description="Transliterate the v101/EVA transcription as set up in config.json.")
+parser.add_argument("--metrics", nargs="?", const=True, metavar="PATH",
+                    help="Record per-stage timings and counters (to PATH instead of metricsPath)")
+parser.add_argument("--trace-memory", action="store_true", help="Also record each stage's peak Python allocations")
+parser.add_argument("--profile", nargs="?", const=True, metavar="FOLDER",
+                    help="Dump a cProfile .pstats file per stage (to FOLDER instead of profileFolder)")
+args = parser.parse_args()
+if isinstance(args.metrics, str): config["metricsPath"] = args.metrics
+if isinstance(args.profile, str): config["profileFolder"] = args.profile
+
+# Profiling or memory tracing, from config.json or the command line, also records the metrics they belong to
+profiling = config["enableProfiling"] or bool(args.profile)
+trace_memory = config["traceMemory"] or args.trace_memory
+metrics = Metrics(enabled=config["enableMetrics"] or bool(args.metrics) or profiling or trace_memory,
+                  trace_memory=trace_memory,
+                  profile_folder=config["profileFolder"] if profiling else None)
 
-# Parse Mapping
-is_initial = False
-is_final = False
-is_first = False
-is_second = False
-is_third = False
-is_fourth = False
-
-with open(mapPath, "r", encoding="utf-8") as mapFile:
-  with open(inputPath, "r", encoding="utf-8") as v101File:
-
-    foundChars = []
-
-    for char in v101File.read():
-
-      if not char in foundChars and char != "\n" and char != "," and char != "." and char != "-" and char != "=":
-        foundChars.append(char)
-
-    foundChars.sort()
-
-    cleaned_chars = []
-    for s in foundChars:
-      processed = ''.join(s.split())
-      if processed:
-        cleaned_chars.append(processed)
-
-  mapping = json.load(mapFile)
-
-  i = 0
-  while i < len(foundChars) - 1:
-    line = mapping[foundChars[i]]
-    is_initial = False
-    is_final = False
-    is_first = False
-    is_second = False
-    is_third = False
-    is_fourth = False
-
-    if line.endswith(config["startOfWordMarker"]):
-      line = line[:-1]
-      is_initial = True
-    if line.endswith(config["endOfWordMarker"]):
-      line = line[:-1]
-      is_final = True
-    if line.endswith(config["firstOccuranceMarker"]):
-      line = line[:-1]
-      is_first = True
-    if line.endswith(config["secondOccuranceMarker"]):
-      line = line[:-1]
-      is_second = True
-    if line.endswith(config["thirdOccuranceMarker"]):
-      line = line[:-1]
-      is_third = True
-    if line.endswith(config["fourthOccuranceMarker"]):
-      line = line[:-1]
-      is_fourth = True
-
-    char = foundChars[i]
-    outputChar = mapping[char].strip(config["endOfWordMarker"]).strip(config["startOfWordMarker"])
-    number = i
-
-    if is_initial:
-      input_char_to_num_initial[char] = number
-      input_num_to_char_initial[number] = outputChar
-      char_to_num_initial[char] = number
-      num_to_char_initial[number] = outputChar
-    elif is_final:
-      input_char_to_num_final[char] = number
-      input_num_to_char_final[number] = outputChar
-      char_to_num_final[char] = number
-      num_to_char_final[number] = outputChar
-    elif is_first:
-      input_char_to_num_first[char] = number
-      input_num_to_char_first[number] = outputChar
-      char_to_num_first[char] = number
-      num_to_char_first[number] = outputChar
-    elif is_second:
-      input_char_to_num_second[char] = number
-      input_num_to_char_second[number] = outputChar
-      char_to_num_second[char] = number
-      num_to_char_second[number] = outputChar
-    elif is_third:
-      input_char_to_num_third[char] = number
-      input_num_to_char_third[number] = outputChar
-      char_to_num_third[char] = number
-      num_to_char_third[number] = outputChar
-    elif is_fourth:
-      input_char_to_num_fourth[char] = number
-      input_num_to_char_fourth[number] = outputChar
-      char_to_num_fourth[char] = number
-      num_to_char_fourth[number] = outputChar
+# Read Input
+inputPath, mapPath = TRANSCRIPTIONS[config["transliteration"]]
+
+with metrics.stage("read_input"):
+  # OPTIMIZATION: The cleaned file is memory-mapped and only the selected lines are decoded, in one piece.
+  # Its '.' and ',' separators are left for the transliterator, which turns them into the delimiters as it tokenizes
+  with CleanedFile(inputPath) as cleanedFile:
+    # Folio/quire/language/hand selectors seek straight to the matching pages
+    inputData, selected_by_locus = read_selection(cleanedFile, config)
+    if selected_by_locus:
+      print(f"Selected {count_lines(inputData)} lines by locus...")
+  line_count = count_lines(inputData)
+  if not selected_by_locus:
+    if config["endLine"] == -1:
+      print(f"Processing lines {config["startLine"]-1} to {line_count}...")
     else:
-      input_char_to_num_normal[char] = number
-      input_num_to_char_normal[number] = outputChar
-      char_to_num_normal[char] = number
-      num_to_char_normal[number] = outputChar
-
-    i += 1
-
-all_keys = (list(input_char_to_num_normal.keys()) +
-            list(input_char_to_num_final.keys()) +
-            list(input_char_to_num_initial.keys()) +
-            list(input_char_to_num_first.keys()) +
-            list(input_char_to_num_second.keys()) +
-            list(input_char_to_num_third.keys()) +
-            list(input_char_to_num_fourth.keys()) +
-            list(char_to_num_normal.keys()) + list(char_to_num_final.keys()) +
-            list(char_to_num_initial.keys()) + list(char_to_num_first.keys()) +
-            list(char_to_num_second.keys()) + list(char_to_num_third.keys()) +
-            list(char_to_num_fourth.keys()) + list(num_to_char_normal.keys()) +
-            list(num_to_char_final.keys()) + list(num_to_char_initial.keys()) +
-            list(num_to_char_first.keys()) + list(num_to_char_second.keys()) +
-            list(num_to_char_third.keys()) + list(num_to_char_fourth.keys()))
-
-string_keys = [k for k in all_keys if isinstance(k, str)]
-MAX_KEY_LENGTH = max((len(k) for k in string_keys), default=1)
-
-### Core Functions ###
-def is_word_start(index, data):
-  if index == 0: return True
-  prev_char = data[index - 1]
-  return prev_char in [config["spaceDelimiter"], config["ambiguousSpaceDelimiter"], "\n"]
-
-
-def is_word_end(index, data, length=1):
-  if index + length >= len(data): return True
-  return data[index +
-              length] in [config["spaceDelimiter"], config["ambiguousSpaceDelimiter"], "\n"]
-
-
-def getChar(inputNum, index, data, length, occurrence):
-  if inputNum == "\n": return "\n"
-  at_end = is_word_end(index, data, length)
-  at_start = is_word_start(index, data)
-
-  if at_start and inputNum in input_num_to_char_initial:
-    return input_num_to_char_initial[inputNum]
-  if at_end and inputNum in input_num_to_char_final:
-    return input_num_to_char_final[inputNum]
-
-  if occurrence == 1 and inputNum in input_num_to_char_first:
-    return input_num_to_char_first[inputNum]
-  if occurrence == 2 and inputNum in input_num_to_char_second:
-    return input_num_to_char_second[inputNum]
-  if occurrence == 3 and inputNum in input_num_to_char_third:
-    return input_num_to_char_third[inputNum]
-  if occurrence == 4 and inputNum in input_num_to_char_fourth:
-    return input_num_to_char_fourth[inputNum]
-
-  if inputNum in input_num_to_char_normal:
-    return input_num_to_char_normal[inputNum]
-  return num_to_char_normal.get(inputNum, "")
-
-
-def getNum(inputChar, index, data, occurrence):
-  if inputChar == "\n": return "\n"
-  length = len(inputChar)
-  at_end = is_word_end(index, data, length)
-  at_start = is_word_start(index, data)
-
-  if at_end and inputChar in char_to_num_final:
-    return char_to_num_final[inputChar]
-  if at_start and inputChar in char_to_num_initial:
-    return char_to_num_initial[inputChar]
-
-  if occurrence == 1 and inputChar in char_to_num_first:
-    return char_to_num_first[inputChar]
-  if occurrence == 2 and inputChar in char_to_num_second:
-    return char_to_num_second[inputChar]
-  if occurrence == 3 and inputChar in char_to_num_third:
-    return char_to_num_third[inputChar]
-  if occurrence == 4 and inputChar in char_to_num_fourth:
-    return char_to_num_fourth[inputChar]
-
-  return char_to_num_normal.get(inputChar, "")
+      print(f"Processed {line_count} lines...")
+  # OPTIMIZATION: The alphabet and glyph frequencies come from one pass over the text already read
+  inventory = glyph_inventory(inputData)
+metrics.count("input.lines", line_count)
+metrics.count("input.chars", len(inputData))
+metrics.count("input.alphabet", len(inventory))
 
+# Parse Mapping
+with metrics.stage("parse_mapping"):
+  with open(mapPath, "r", encoding="utf-8") as mapFile:
+    mapping = json.load(mapFile)
+  # OPTIMIZATION: Each distinct word is matched glyph by glyph once; repeats are copied from a word cache
+  transliterator = Transliterator(mapping, config, word_cache_size=config["wordCacheSize"])
+  # OPTIMIZATION: Lines unaffected by a mapping edit are reused from the previous run
+  transliteration_cache = None
+  if config["transliterationCachePath"]:
+    from incremental import TransliterationCache
+    transliteration_cache = TransliterationCache(config["transliterationCachePath"], mapping, config)
+metrics.count("mapping.glyphs", len(transliterator.table))
+# Characters no mapped glyph is made of are dropped from the output
+mapped_chars = set("".join(transliterator.table))
+unmapped = [glyph for glyph in sorted(inventory) if glyph not in mapped_chars]
+if unmapped:
+  print(f"[!] ERROR: {len(unmapped)} glyphs are not in '{mapPath}' and will be dropped: "
+        + ", ".join(f"{glyph!r} ({inventory[glyph]}x)" for glyph in unmapped))
+  print(f"[!] Add them to the mapping; 'python mapping.py {inputPath} --counts' lists every glyph of the input"
+        " without writing a mapping.")
+if metrics.enabled:
+  transliterator.glyph_counts = Counter()
 
 ### Main Transliteration Loop ###
-output_chars_list = []
-output_nums_list = ["."]
-i = 0
-word_char_counts = {}
-
-while i < len(inputData):
-  ch = inputData[i]
-
-  if ch == "\n":
-    output_nums_list.append("\n.")
-    output_chars_list.append("\n")
-    word_char_counts.clear()
-    i += 1
-    continue
-
-  if ch in [config["spaceDelimiter"], config["ambiguousSpaceDelimiter"]]:
-    output_nums_list.append(ch + ".")
-    output_chars_list.append(ch)
-    word_char_counts.clear()
-    i += 1
-    continue
-
-  match_str = ch
-  match_len = 1
-
-  for length in range(MAX_KEY_LENGTH, 0, -1):
-    if i + length > len(inputData):
-      continue
-    inputChars = inputData[i:i + length]
-    if (inputChars in input_char_to_num_normal
-        or inputChars in input_char_to_num_final
-        or inputChars in input_char_to_num_initial
-        or inputChars in input_char_to_num_first
-        or inputChars in input_char_to_num_second
-        or inputChars in input_char_to_num_third
-        or inputChars in input_char_to_num_fourth):
-      match_str = inputChars
-      match_len = length
-      break
-
-  current_occurrence = word_char_counts.get(match_str, 0) + 1
-  word_char_counts[match_str] = current_occurrence
-
-  encoded = getNum(match_str, i, inputData, current_occurrence)
-  decoded = getChar(encoded, i, inputData, match_len, current_occurrence)
-
-  output_nums_list.append(str(encoded) + ".")
-  output_chars_list.append(decoded)
-  i += match_len
-
-outputRaw = "".join(output_chars_list)
-outputFile.write(outputRaw)
-outputFile.close()
-
-outputClean = outputRaw.replace(config["spaceDelimiter"], "").replace(config["ambiguousSpaceDelimiter"], "")#.replace("\n", "")
-outputForWords = outputRaw.replace(config["spaceDelimiter"], " ").replace(config["ambiguousSpaceDelimiter"], " ")#.replace("\n", " ")
-analysisFile = open(config["analysisPath"], "w", encoding="utf-8")
-counts = Counter(outputClean)
-total_chars = len(outputClean)
+with metrics.stage("transliterate"):
+  # OPTIMIZATION: Large inputs are transliterated in shards of whole lines across worker processes
+  workers = config["transliterationWorkers"] or os.cpu_count() or 1
+  glyph_text = None
+  if transliteration_cache:
+    outputRaw = transliteration_cache.transliterate(split_lines(inputData), transliterator, workers)
+  else:
+    # OPTIMIZATION: Glyph codes in an array instead of a tuple per glyph; the text is built from them once
+    glyph_text = transliterator.encode_text(inputData, workers)
+    outputRaw = glyph_text.text()
+  with open(config["outputPath"], "w", encoding="utf-8") as outputFile:
+    outputFile.write(outputRaw)
+if transliteration_cache:
+  metrics.count("transliteration_cache.reused_lines", transliteration_cache.reused)
+  metrics.count("transliteration_cache.redone_lines", len(transliteration_cache.redone))
+  metrics.count("transliteration_cache.invalidated_lines", transliteration_cache.invalidated)
+if transliterator.glyph_counts is not None:
+  metrics.update("glyphs", transliterator.glyph_counts)
+if transliterator.word_cache is not None:
+  metrics.update("word_cache", transliterator.word_cache.stats())
+  metrics.value("word_cache.hit_rate", round(transliterator.word_cache.hit_rate(), 6))
+
+def output_for_words():
+  # Built only for the stages that want plain spaces
+  return outputRaw.replace(config["spaceDelimiter"], " ").replace(config["ambiguousSpaceDelimiter"], " ")#.replace("\n", " ")
 
 ### Analysis Helpers ###
-def analyze_reduplication(word_string):
+def analyze_reduplication(stats):
   analysisFile.write("\n_____________________________\n")
-  normalized = word_string.replace("\n", " ").replace(config["ambiguousSpaceDelimiter"], " ").replace(config["spaceDelimiter"], " ")
-  words = [w for w in normalized.split(" ") if w]
-  redup_pairs = []
-  redup_count = 0
-  for k in range(len(words) - 1):
-    if words[k] == words[k + 1]:
-      redup_count += 1
-      redup_pairs.append(words[k])
+  redup_count = sum(stats.reduplications.values())
   analysisFile.write(f"\nImmediate Reduplications: {redup_count}\n")
   if redup_count > 0:
-    c = Counter(redup_pairs)
     analysisFile.write("Most Frequent Repeating Words:\n")
-    for word, cnt in c.most_common(10):
+    for word, cnt in stats.reduplications.most_common(10):
       analysisFile.write(f"{{ {word}: {cnt} times }}\n")
   analysisFile.write("_____________________________\n")
 
 
-def analyze_word_parts():
-  normalized = outputRaw.replace("\n", config["spaceDelimiter"]).replace(config["ambiguousSpaceDelimiter"], config["spaceDelimiter"])
-  words = [w for w in normalized.split(config["spaceDelimiter"]) if w]
-  total_words = len(words)
+def analyze_word_parts(stats):
+  total_words = stats.total_words
   analysisFile.write("Total Words Processed: " + str(total_words) + "\n")
   analysisFile.write("_____________________________\n")
 
-  word_counts = Counter(words)
   analysisFile.write("\nMost Common Whole Words:\n")
-  for word, count in word_counts.most_common(20):
+  for word, count in stats.word_counts.most_common(20):
     pct = round((count / total_words) * 100, 2)
     analysisFile.write(f"{{ {word}: {count}, {pct}% }}\n")
   analysisFile.write("_____________________________\n")
@@ -354,21 +139,11 @@ def analyze_word_parts():
   min_ngram = 2
   max_ngram = 4
   for n in range(min_ngram, max_ngram + 1):
-    prefixes = []
-    suffixes = []
-    affixes = []
-    for word in words:
-      word_len = len(word)
-      if word_len < n: continue
-      prefixes.append(word[:n])
-      suffixes.append(word[-n:])
-      for i in range(0, word_len - n + 1):
-        affixes.append(word[i:i + n])
-
-    def write_stats(title, data_list):
-      if not data_list: return
-      item_counts = Counter(data_list)
-      total_items = len(data_list)
+    prefixes, suffixes, affixes = stats.ngram_counts(n)
+
+    def write_stats(title, item_counts):
+      if not item_counts: return
+      total_items = sum(item_counts.values())
       analysisFile.write(f"\n{title} (Length {n}):\n")
       for item, count in item_counts.most_common(20):
         pct = round((count / total_items) * 100, 2)
@@ -379,255 +154,163 @@ def analyze_word_parts():
     write_stats("Common Affixes", affixes)
 
 
-def entropy():
-  e = 0.0
-  for count in counts.values():
-    p = count / total_chars
-    e -= p * math.log2(p)
+def entropy(counts):
+  e = char_entropy(counts)
   analysisFile.write("Character Entropy: " + str(round(e, 3)) + " Bits\n")
   analysisFile.write("_____________________________\n\n")
 
 
-def frequency():
-  freq = {}
-  total_chars = len(outputClean) 
-  
-  for char in set(outputClean):
-    if char != "\n":
-      freq[char] = outputClean.count(char)
-  
-  freq_sorted = sorted(freq.items(), key=lambda x: x[1], reverse=True)
-  
+def frequency(counts):
+  total_chars = sum(counts.values())
+  freq_sorted = sorted(counts.items(), key=lambda x: x[1], reverse=True)
+
   analysisFile.write("Character Frequency:\n")
   for char, count in freq_sorted:
     if char != "\n":
       percentage = round(count / total_chars * 100, 3) if total_chars > 0 else 0
       analysisFile.write(f"{{ {char}: {count}, {percentage}% }}\n")
-  
-  analysisFile.write("_____________________________\n\n")   
-
-
-def sukhotin_vowel_analysis(text):
-  valid_chars = [c for c in text if c.isalnum()]
-  alphabet = sorted(list(set(valid_chars)))
-  n = len(alphabet)
-  char_to_index = {c: i for i, c in enumerate(alphabet)}
-  matrix = [[0] * n for _ in range(n)]
-  for k in range(len(valid_chars) - 1):
-    i = char_to_index[valid_chars[k]]
-    j = char_to_index[valid_chars[k + 1]]
-    matrix[i][j] += 1
-    matrix[j][i] += 1
-  is_vowel = [False] * n
+
+  analysisFile.write("_____________________________\n\n")
+
+
+def sukhotin_vowel_analysis(stats):
+  alphabet, pairs = stats.adjacency()
+  steps, vowels, consonants = sukhotin_classify(alphabet, pairs)
   analysisFile.write("\nSukhotin's Vowel Classification:\n\n")
-  while True:
-    scores = []
-    for i in range(n):
-      if is_vowel[i]:
-        scores.append(-float('inf'))
-        continue
-      score = 0
-      for j in range(n):
-        if not is_vowel[j]:
-          score += matrix[i][j]
-      scores.append(score)
-    max_score = max(scores)
-    if max_score <= 0: break
-    candidate_idx = scores.index(max_score)
-    is_vowel[candidate_idx] = True
+  for vowel, score in steps:
     analysisFile.write(
-        f"identified potential vowel: {alphabet[candidate_idx]} (Score: {max_score})\n"
+        f"identified potential vowel: {vowel} (Score: {score})\n"
     )
-  vowels = [alphabet[i] for i in range(n) if is_vowel[i]]
-  consonants = [alphabet[i] for i in range(n) if not is_vowel[i]]
   analysisFile.write(
       f"\nFinal Vowels: {vowels}\nFinal Consonants: {consonants}\n")
 
 
 if config["enableAnalysis"]:
-  entropy()
-  frequency()
-  analyze_word_parts()
-  analyze_reduplication(outputRaw)
-  sukhotin_vowel_analysis(outputClean)
-  analysisFile.flush()
+  from analysis import TextStatistics, char_entropy, sukhotin_classify
+  analysisFile = open(config["analysisPath"], "w", encoding="utf-8")
+  with metrics.stage("analysis"):
+    if transliteration_cache:
+      # Only the redone lines' words are recounted when the same lines were analyzed last run
+      stats = transliteration_cache.statistics(transliterator, outputRaw)
+    else:
+      # One pass over the output words fills every counter below
+      stats = TextStatistics()
+      stats.add_words(glyph_text.words())
+      stats.newlines = outputRaw.count("\n")
+    counts = stats.char_counts()
+    entropy(counts)
+    frequency(counts)
+    analyze_word_parts(stats)
+    analyze_reduplication(stats)
+    sukhotin_vowel_analysis(stats)
+    analysisFile.close()
+  metrics.count("analysis.words", stats.total_words)
+  metrics.count("analysis.distinct_words", len(stats.word_counts))
   print("Finished Analysis.")
 
 
 ### Graph Zipf's Law ###
-def plot_zipf_law(text):
+def plot_zipf_law(word_counts, fit):
   try:
-    import numpy as np
-    import matplotlib.pyplot as plt
-    words = text.split()
-    counts_z = Counter(words)
-    sorted_counts = sorted(counts_z.values(), reverse=True)
-    if not sorted_counts: return
-    ranks = np.arange(1, len(sorted_counts) + 1)
-    frequencies = np.array(sorted_counts)
-    plt.figure(figsize=(14, 8))
-    plt.loglog(ranks,
-               frequencies,
-               marker=".",
-               linestyle="none",
-               color="blue",
-               alpha=0.7,
-               markersize=8,
-               label="Transliteration")
-    c = frequencies
-    references = [("Modern English", 1.00, "grey", "--"),
-                  ("Middle High German", 1.03, "green", ":"),
-                  ("Old French/Italian", 1.06, "orange", "-."),
-                  ("Old English", 1.08, "purple", ":"),
-                  ("Latin", 1.15, "yellow", "-.")]
-    if config["enableZipfsReferenceLines"]:
-      for label, slope, color, style in references:
-        ref_line = c / (ranks**slope)
-        plt.loglog(ranks,
-                   ref_line,
-                   linestyle=style,
-                   color=color,
-                   linewidth=1.5,
-                   alpha=0.6,
-                   label=f"{label} (s={slope})")
-    plt.title("Zipf's Law Analysis", fontsize=20)
-    plt.xlabel("Rank (log scale)", fontsize=16)
-    plt.ylabel("Frequency (log scale)", fontsize=16)
-    plt.grid(True, which="both", ls="-", alpha=0.2)
-    plt.legend(bbox_to_anchor=(1.02, 1),
-               loc='upper left',
-               borderaxespad=0,
-               fontsize=14)
-    plt.tight_layout()
-    plt.savefig("zipf_analysis.png", dpi=150)
-    print("Zipf's law plot saved.")
+    if plot_zipf(word_counts, "zipf_analysis.png", config["enableZipfsReferenceLines"],
+                 config["zipfsBinsPerDecade"], fit):
+      print("Zipf's law plot saved.")
+    else:
+      print("Zipf's law plot unchanged.")
   except ImportError:
     print("Matplotlib not installed.")
 
 
 if config["enableZipfsLawGeneration"]:
-  plot_zipf_law(outputForWords)
-
-import base64
+  from analysis import zipf_fit
+  from zipf import plot_zipf
+  with metrics.stage("zipf"):
+    # OPTIMIZATION: The analysis' word counts are reused, and the fit is vectorized
+    if config["enableAnalysis"]:
+      word_counts = stats.word_counts
+    else:
+      word_counts = Counter(glyph_text.words() if glyph_text else transliterator.iter_words(outputRaw))
+    fit = zipf_fit(word_counts)
+    if fit[0] is not None:
+      print(f"Zipf exponent: {fit[0]:.4f} (R² = {fit[1]:.4f})")
+      metrics.value("zipf.exponent", fit[0])
+      metrics.value("zipf.r_squared", fit[1])
+    if config["enableZipfsPlot"]:
+      plot_zipf_law(word_counts, fit)
 
 ### Comparison HTML ###
+def report_sections(line_count):
+  """One (folio, line count) section per page of the selected lines, or None without a locus index."""
+  index = load_index(inputPath)
+  if index is None: return None
+  if selected_by_locus:
+    pages = select_pages(index, config["selectFolios"], config["selectQuires"], config["selectLanguages"], config["selectHands"])
+    return [[page["page"], page["lines"][1] - page["lines"][0] + 1] for page in pages]
+  return line_pages(index, max(config["startLine"], 1), line_count)
+
+
 def generate_html_report(original_text, transliterated_text):
   font_path = "voynich.ttf" # Ensure this path is correct relative to where you run the script
-  font_css = ""
-  font_family = "sans-serif"
-
-  if config["useVoynichChars"] and os.path.exists(font_path):
-      with open(font_path, "rb") as f:
-          font_data = base64.b64encode(f.read()).decode('utf-8')
-          font_css = f"""
-          @font-face {{
-              font-family: 'EmbeddedVoynich';
-              src: url('data:font/ttf;base64,{font_data}') format('truetype');
-          }}
-          """
-          font_family = "EmbeddedVoynich"
-
-  orig_lines = original_text.replace(config["spaceDelimiter"], " ").replace(config["ambiguousSpaceDelimiter"], " ").split("\n")
-  trans_lines = transliterated_text.replace(config["spaceDelimiter"], " ").replace(config["ambiguousSpaceDelimiter"], " ").split("\n")
-  
-  # Inject the font directly into the CSS
-  html = f"""<html><head><style>
-    {font_css}
-    body{{font-family:sans-serif;padding:20px;background:#f0f0f0}}
-    .container{{display:flex;flex-direction:column;gap:10px}}
-    .row{{display:flex;background:white;border-bottom:1px solid #ccc;padding:10px}}
-    .trans{{flex:1;padding-right:10px;border-right:1px solid #eee;color:#333;font-family:'{font_family}', sans-serif}}
-    .orig{{flex:1;padding-left:10px;font-family:'Courier New',monospace}}
-    </style></head><body><h1>Comparison</h1><div class='container'>"""
-  
-  import html as html_lib
-  for t, o in zip(trans_lines, orig_lines):
-    if not t.strip() and not o.strip(): continue
-    html += f"<div class='row'><div class='trans'>{html_lib.escape(t)}</div><div class='orig'>{html_lib.escape(o)}</div></div>"
-  
-  html += "</div></body></html>"
-  with open("comparison.html", "w", encoding="utf-8") as f:
-    f.write(html)
-  print("HTML Report saved.")   
-  
-  for t, o in zip(trans_lines, orig_lines):
-    if not t.strip() and not o.strip(): continue
-    import html as html_lib
-    safe_t = html_lib.escape(t)
-    safe_o = html_lib.escape(o)
-    html += f"<div class='row'><div class='trans'>{safe_t}</div><div class='orig'>{safe_o}</div></div>"
-  
-  html += "</div></body></html>"
-  
+  use_font = config["useVoynichChars"] and os.path.exists(font_path)
+
+  orig_lines = transcription_lines(original_text, config)
+  trans_lines = comparison_lines(transliterated_text, config)
+
+  # OPTIMIZATION: One page per folio so the full manuscript opens quickly in a browser
+  if config["htmlPaginate"]:
+    sections = report_sections(line_count)
+    if sections is not None:
+      folder = write_paginated_report("comparison.html", sections, trans_lines, orig_lines,
+                                      font_path if use_font else None, config["htmlFontMode"])
+      print(f"HTML Report saved ({len(sections)} pages in '{folder}').")
+      return
+    print(f"[!] ERROR: No up-to-date locus index for '{inputPath}'. Writing a single page instead.")
+
+  font_css, font_family = "", "sans-serif"
+  if use_font:
+    font_css, font_family = font_face(font_path, config["htmlFontMode"])
+  # OPTIMIZATION: Rows are streamed to the file instead of concatenated into one string
+  write_report("comparison.html", trans_lines, orig_lines, font_css, font_family)
+  print("HTML Report saved.")
+
 if config["enableHTMLComparison"]:
-  generate_html_report(inputData, outputRaw)
+  from cleaner import line_pages, load_index, select_pages
+  from report import comparison_lines, font_face, transcription_lines, write_paginated_report, write_report
+  with metrics.stage("html"):
+    generate_html_report(inputData, outputRaw)
   print("Saved HTML file.")
 
 ### Translation ###
-if config["enablePrintLanguages"]:
-  try:
-    from deep_translator import GoogleTranslator
-    print(GoogleTranslator().get_supported_languages(as_dict=True))
-  except:
-    pass
+if config["enablePrintLanguages"] or config["enableTranslation"]:
+  from translation import TranslationCache, get_backend, translate_text
 
-if config["enableTranslation"]:
+if config["enablePrintLanguages"]:
   try:
-    from deep_translator import GoogleTranslator
-    translateFile = open(config["translatePath"], "w", encoding="utf-8")
-    translateFile.close()
-    translateFile = open(config["translatePath"], "a", encoding="utf-8")
-    chunk_size = 4900
-    for i in range(0, len(outputRaw), chunk_size):
-      chunk = outputRaw[i:i + chunk_size]
-      chunk_clean = chunk.replace(config["spaceDelimiter"], " ").replace(config["ambiguousSpaceDelimiter"], " ")
-      translated = GoogleTranslator(
-          source='la', target=config["translationLanguage"]).translate(text=chunk_clean)
-      translateFile.write(translated + " ")
-    print("Translated output.")
-  except:
+    print(get_backend(config["translationBackend"]).supported_languages())
+  except ImportError:
     print("Translator not installed.")
+  except ValueError as e:
+    print(f"[!] ERROR: {e}")
 
+if config["enableTranslation"]:
+  with metrics.stage("translation"):
+    try:
+      backend = get_backend(config["translationBackend"])
+    except ImportError:
+      print("Translator not installed.")
+    except ValueError as e:
+      print(f"[!] ERROR: {e}")
+    else:
+      # OPTIMIZATION: Chunks split on line/word boundaries, sent concurrently and cached by hash
+      translation_cache = TranslationCache(config["translationCachePath"])
+      counts, errors = translate_text(output_for_words(), backend, "la", config["translationLanguage"], config["translatePath"],
+                                      translation_cache, config["translationWorkers"])
+      translation_cache.write()
+      for number, error in errors:
+        print(f"[!] ERROR: Chunk {number} of {counts["chunks"]} was not translated: {error}")
+      print(f"Translated output ({counts["sent"]} chunks sent, {counts["cached"]} cached).")
+      metrics.update("translation", counts)
 
-### Corpus Analysis (Levenshtein Distance) ###
-@lru_cache(maxsize=None)
-def levenshtein_distance(s1, s2):
-    """Calculates the minimum number of edits required to change s1 into s2."""
-    if len(s1) < len(s2):
-        return levenshtein_distance(s2, s1)
-    if len(s2) == 0:
-        return len(s1)
-
-    previous_row = range(len(s2) + 1)
-    for i, c1 in enumerate(s1):
-        current_row = [i + 1]
-        for j, c2 in enumerate(s2):
-            insertions = previous_row[j + 1] + 1
-            deletions = current_row[j] + 1
-            substitutions = previous_row[j] + (c1 != c2)
-            current_row.append(min(insertions, deletions, substitutions))
-        previous_row = current_row
-    return previous_row[-1]
-
-def get_best_levenshtein_match(word, dictionary, max_edits):
-    """Finds the best match in the dictionary within the allowed edit distance."""
-    best_match = None
-    best_distance = max_edits + 1  # Must be strictly less than this to qualify
-
-    for dict_word in dictionary:
-        # Optimization: If length difference is greater than max_edits, it's mathematically impossible to match
-        if abs(len(word) - len(dict_word)) > max_edits:
-            continue
-
-        dist = levenshtein_distance(word, dict_word)
-        if dist < best_distance:
-            best_distance = dist
-            best_match = dict_word
-            # If we find a match with only 1 edit, take it immediately to save processing time
-            if best_distance <= 1: 
-                break
-
-    return best_match
 
 ### Corpus Analysis ###
 def run_corpus_analysis(transliterated_text):
@@ -653,31 +336,60 @@ def run_corpus_analysis(transliterated_text):
         print("[!] The dictionary is empty. Skipping Corpus Analysis.\n")
         return
 
-    remove_punct_map = str.maketrans('.,;:!?()"[]{}', '             ')
+    # OPTIMIZATION: Reuse the dictionary, index and match results of an earlier run on the same reference files
+    cache_path = config["referenceCachePath"]
+    cache_signature = reference_signature(config["referenceFolder"], reference_files)
+    cached = load_cache(cache_path, cache_signature) if cache_path else None
 
-    for filename in reference_files:
-        with open(os.path.join(config["referenceFolder"], filename), "r", encoding="utf-8", errors='ignore') as f:
-            content = f.read().lower().translate(remove_punct_map)
-            known_words.update(content.split())
+    if cached:
+        fuzzy_index, stored_matches = cached
+        known_words = set(fuzzy_index.words)
+    else:
+        remove_punct_map = str.maketrans('.,;:!?()"[]{}', '             ')
 
-    if not known_words: 
-        print("\n[!] ERROR: Reference texts were empty. Skipping Corpus Analysis.\n")
-        return
+        for filename in reference_files:
+            with open(os.path.join(config["referenceFolder"], filename), "r", encoding="utf-8", errors='ignore') as f:
+                content = f.read().lower().translate(remove_punct_map)
+                known_words.update(content.split())
 
-    known_words_seq = tuple(known_words)
+        if not known_words: 
+            print("\n[!] ERROR: Reference texts were empty. Skipping Corpus Analysis.\n")
+            return
+
+        fuzzy_index = FuzzyIndex(sorted(known_words))
+        stored_matches = {}
 
     findings_segmentation = []
     findings_fuzzy = []
     corrected_text_list = []
     match_cache = {}
-    merge_cache = {}
-
-    # 3. Validation Logic
-    def is_valid_merge(original, match):
-        """Ensures the merge isn't just a wild guess."""
-        common = Counter(original) & Counter(match)
-        overlap = sum(common.values())
-        return (overlap / len(match)) >= 0.80 
+    # Results depend on the cutoffs, so they are stored per tolerance level
+    tolerance_matches = stored_matches.setdefault(str(config["toleranceLevel"]), {"words": {}, "merges": {}})
+    word_matches = tolerance_matches["words"]
+    merge_cache = tolerance_matches["merges"]
+    stored_count = len(word_matches) + len(merge_cache)
+    metrics.count("fuzzy.reference_cache_hits" if cached else "fuzzy.reference_cache_misses")
+    metrics.count("fuzzy.reference_words", len(known_words))
+    metrics.count("fuzzy.stored_results", stored_count)
+
+    cutoff = 0.65 + (config["toleranceLevel"] * 0.05)
+    m_cutoff = min(0.85, 0.70 + (config["toleranceLevel"] * 0.05))
+
+    # 3. Parallel Lookups
+    # OPTIMIZATION: Resolve every lookup the loop below can make across worker processes first,
+    # so the loop only replays its decisions from the filled tables (same output as a serial run)
+    workers = config["fuzzyWorkers"] or os.cpu_count() or 1
+    if workers > 1:
+        unknown = [w for w in dict.fromkeys(trans_words) if w not in known_words]
+        pending = [w for w in unknown if len(w) >= 3 and w not in word_matches]
+        word_matches.update(zip(pending, resolve_matches(fuzzy_index, [(w, cutoff) for w in pending], resolve_word, workers)))
+        metrics.count("fuzzy.parallel_lookups", len(pending))
+
+        unmatched = {w for w in unknown if len(w) < 3 or not word_matches[w][0]}
+        pending = [m for m in dict.fromkeys(w1 + w2 for w1, w2 in zip(trans_words, trans_words[1:]) if w1 in unmatched)
+                   if len(m) >= 4 and m not in known_words and m not in merge_cache]
+        merge_cache.update(zip(pending, resolve_matches(fuzzy_index, [(m, m_cutoff) for m in pending], resolve_merge, workers)))
+        metrics.count("fuzzy.parallel_lookups", len(pending))
 
     # 4. Analysis Loop
     i = 0
@@ -702,12 +414,11 @@ def run_corpus_analysis(transliterated_text):
         if w1 in match_cache:
             best_match = match_cache[w1]
         elif len(w1) >= 3:
-            cutoff = 0.65 + (config["toleranceLevel"] * 0.05)
-            # OPTIMIZATION: Pass known_words_seq instead of the set
-            matches = difflib.get_close_matches(w1, known_words_seq, n=1, cutoff=cutoff)
-            if matches:
-                best_match = matches[0]
-                score = round(difflib.SequenceMatcher(None, w1, best_match).ratio() * 100)
+            if w1 not in word_matches:
+                # OPTIMIZATION: Indexed lookup, same result as difflib.get_close_matches(n=1)
+                word_matches[w1] = word_match(fuzzy_index, w1, cutoff)
+            best_match, score = word_matches[w1]
+            if best_match:
                 findings_fuzzy.append(f"Word '{w1}' -> '{best_match}' ({score}%)")
             match_cache[w1] = best_match
 
@@ -720,35 +431,26 @@ def run_corpus_analysis(transliterated_text):
         if i + 1 < total_words:
             m2_cand = w1 + trans_words[i+1]
             if len(m2_cand) >= 4:
-                # OPTIMIZATION: Check merge cache
-                if m2_cand in merge_cache:
-                    res, score = merge_cache[m2_cand]
-                    if res:
-                        findings_segmentation.append(f"Merge '{w1}'+'{trans_words[i+1]}' -> '{res}' (Fuzzy {score}%)")
-                        corrected_text_list.append(res)
-                        i += 2
-                        continue
-                else:
-                    m_cutoff = min(0.85, 0.70 + (config["toleranceLevel"] * 0.05))
-                    # OPTIMIZATION: Pass known_words_seq instead of the set
-                    m_matches = difflib.get_close_matches(m2_cand, known_words_seq, n=1, cutoff=m_cutoff)
-                    if m_matches:
-                        res = m_matches[0]
-                        if is_valid_merge(m2_cand, res):
-                            score = round(difflib.SequenceMatcher(None, m2_cand, res).ratio() * 100)
-                            merge_cache[m2_cand] = (res, score)
-                            findings_segmentation.append(f"Merge '{w1}'+'{trans_words[i+1]}' -> '{res}' (Fuzzy {score}%)")
-                            corrected_text_list.append(res)
-                            i += 2
-                            continue
-
-                    # Cache the failure so we don't try this bad merge again
-                    merge_cache[m2_cand] = (None, 0)
+                # OPTIMIZATION: Check merge cache (failures are cached as (None, 0) so we don't try a bad merge again)
+                if m2_cand not in merge_cache:
+                    merge_cache[m2_cand] = merge_match(fuzzy_index, m2_cand, m_cutoff)
+                res, score = merge_cache[m2_cand]
+                if res:
+                    findings_segmentation.append(f"Merge '{w1}'+'{trans_words[i+1]}' -> '{res}' (Fuzzy {score}%)")
+                    corrected_text_list.append(res)
+                    i += 2
+                    continue
 
         # INFINITE LOOP FIX RESTORED:
         corrected_text_list.append(w1)
         i += 1
 
+    metrics.count("fuzzy.new_results", len(word_matches) + len(merge_cache) - stored_count)
+    metrics.count("fuzzy.word_corrections", len(findings_fuzzy))
+    metrics.count("fuzzy.segmentations", len(findings_segmentation))
+    # Candidates examined by in-process lookups (forked workers keep their own counts)
+    metrics.update("fuzzy.index", fuzzy_index.stats())
+
     # 5. Export
     with open(config["corpusReportPath"], "w", encoding="utf-8") as f:
         f.write(f"CORPUS ANALYSIS REPORT\n======================\nTotal Words: {total_words}\n")
@@ -758,13 +460,28 @@ def run_corpus_analysis(transliterated_text):
     with open(config["fuzzyOutputPath"], "w", encoding="utf-8") as f:
         f.write(" ".join(corrected_text_list))
 
+    if cache_path and (not cached or len(word_matches) + len(merge_cache) > stored_count):
+        try:
+            write_cache(cache_path, cache_signature, fuzzy_index, stored_matches)
+        except OSError as e:
+            print(f"[!] ERROR: Could not write the reference cache '{cache_path}': {e}")
+
     print("Analysis Complete.")
     print(f"Report: {config["corpusReportPath"]}")
     print(f"Fuzzy Text Output: {config["fuzzyOutputPath"]}")
 
 if config["enableFuzzyMatching"]:
-  run_corpus_analysis(outputRaw)
+  from fuzzy import (FuzzyIndex, load_cache, merge_match, reference_signature, resolve_matches, resolve_merge,
+                     resolve_word, word_match, write_cache)
+  with metrics.stage("corpus_analysis"):
+    run_corpus_analysis(outputRaw)
 
 ### Closing ###
-outputFile.close()
-analysisFile.close()
+if transliteration_cache:
+  transliteration_cache.write()
+
+if metrics.enabled:
+  metrics.write(config["metricsPath"], {k: config[k] for k in ("transliteration", "startLine", "endLine", "enableAnalysis",
+                                                             "enableZipfsLawGeneration", "enableHTMLComparison",
+                                                             "enableTranslation", "enableFuzzyMatching", "toleranceLevel")})
+  print(f"Metrics: {config["metricsPath"]}")
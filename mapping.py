@@ -1,39 +1,90 @@
-# Input and map file paths
-# Change to "v101_cleaned.txt" and "v101_mapping.txt" if you would like.
-filePath = "eva_cleaned.txt"
-mapFilePath = "eva_mapping.json"
+# The Voynich Transliteration Tool
+# Mapping Generator
+#
+# Writes an identity mapping skeleton for every glyph found in one or more
+# cleaned transcription files. Each file is read once, in chunks, and its
+# glyphs are counted as they are found. With --counts the glyphs are only
+# listed and no mapping is written.
+#
+#   python mapping.py                                  (eva_cleaned.txt -> eva_mapping.json)
+#   python mapping.py v101_cleaned.txt eva_cleaned.txt --counts
+#   python mapping.py transcriptions/*_cleaned.txt --combined all_mapping.json
 
-# Setup foundChars array
-foundChars = []
+### Imports ###
+import argparse
+import json
+import os
+import sys
+from collections import Counter
 
-# Find characters in the input file and save to foundChars
-with open(filePath, "r", encoding="utf-8") as file:
+from transliterator import glyph_inventory
 
-  for char in file.read():
+CHUNK_SIZE = 1 << 20
 
-    if not char in foundChars:
-      foundChars.append(char)
 
-foundChars.sort()
+def file_inventory(path):
+  """Glyph counts of a cleaned transcription file, read a chunk at a time."""
+  counts = Counter()
+  with open(path, "r", encoding="utf-8") as file:
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), ""):
+      glyph_inventory(chunk, counts)
+  return counts
 
-# Wipe map file
-mapFile = open(mapFilePath, "w")
-mapFile.close()
 
-# For each character in foundChars, write the character into the map file
-with open(mapFilePath, "w", encoding="utf") as mapFile:
+def mapping_path(input_path):
+  """eva_cleaned.txt -> eva_mapping.json, next to the input file."""
+  stem = os.path.splitext(input_path)[0]
+  if stem.endswith("_cleaned"):
+    stem = stem[:-len("_cleaned")]
+  return stem + "_mapping.json"
 
-  mapFile.write("{\n")
-  
-  for char in foundChars:
 
-    # Skips input file delimiters and end of line delimters and other misilanious characters
-    if char == "\n" or char == "." or char == "," or char == "\"" or char == "-" or char == "=":
-      pass
-    else:
-      if char == "\\":
-        mapFile.write("    \"\\" + char + "\": \"\\" + char + "\",\n")
-      else:
-        mapFile.write("    \"" + char + "\": \"" + char + "\",\n")
+def write_mapping(path, counts):
+  # Every glyph maps to itself, in the sorted order main.py numbers them in
+  with open(path, "w", encoding="utf-8") as mapFile:
+    json.dump({glyph: glyph for glyph in sorted(counts)}, mapFile, indent=4, ensure_ascii=False)
+    mapFile.write("\n")
 
-  mapFile.write("}")
+
+def print_counts(counts):
+  total = sum(counts.values())
+  for glyph, n in counts.most_common():
+    print(f"    {glyph!r:>8} {n:>9} {n / total:>8.3%}")
+
+
+def main():
+  parser = argparse.ArgumentParser(description="Write a mapping skeleton for every glyph in cleaned transcription files.")
+  parser.add_argument("inputs", nargs="*", default=["eva_cleaned.txt"],
+                      help="Cleaned transcription files (default: eva_cleaned.txt)")
+  parser.add_argument("--combined", metavar="PATH",
+                      help="Also write one mapping covering the glyphs of every input to PATH")
+  parser.add_argument("--counts", action="store_true",
+                      help="Only print each file's glyph frequencies; no per-file mapping is written")
+  args = parser.parse_args()
+
+  missing = [path for path in args.inputs if not os.path.exists(path)]
+  if missing:
+    print(f"ERROR: File not found: {', '.join(missing)}")
+    sys.exit(1)
+
+  combined = Counter()
+  for path in args.inputs:
+    counts = file_inventory(path)
+    combined.update(counts)
+    if args.counts:
+      # Listing only, so a hand-edited mapping next to the input is never replaced
+      print(f"{path}: {len(counts)} glyphs, {sum(counts.values())} occurrences")
+      print_counts(counts)
+      continue
+    output = mapping_path(path)
+    write_mapping(output, counts)
+    print(f"{path}: {len(counts)} glyphs, {sum(counts.values())} occurrences -> {output}")
+
+  if args.combined:
+    write_mapping(args.combined, combined)
+    print(f"Combined: {len(combined)} glyphs -> {args.combined}")
+
+
+# Run main
+if __name__ == "__main__":
+  main()
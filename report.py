@@ -0,0 +1,115 @@
+# The Voynich Transliteration Tool
+# Comparison Report
+#
+# Writes the side-by-side HTML comparison of the transliteration and the
+# original transcription. Rows are written to the file as they are produced,
+# and large reports can be split into one page per folio with an index page.
+
+### Imports ###
+import base64
+import html as html_lib
+import os
+
+PAGE_HEAD = """<html><head><style>
+    {font_css}
+    body{{font-family:sans-serif;padding:20px;background:#f0f0f0}}
+    .container{{display:flex;flex-direction:column;gap:10px}}
+    .row{{display:flex;background:white;border-bottom:1px solid #ccc;padding:10px}}
+    .trans{{flex:1;padding-right:10px;border-right:1px solid #eee;color:#333;font-family:'{font_family}', sans-serif}}
+    .orig{{flex:1;padding-left:10px;font-family:'Courier New',monospace}}
+    </style></head><body><h1>{title}</h1>"""
+PAGE_TAIL = "</div></body></html>"
+
+
+def font_face(font_path, mode, report_folder="."):
+  """
+  Returns (font_css, font_family) for the Voynich font. "inline" embeds the
+  font as base64 (encoded once, however many pages use it); "sidecar" links
+  to the font file relative to the report folder, so the pages stay small.
+  """
+  if mode == "sidecar":
+    source = os.path.relpath(font_path, report_folder).replace(os.sep, "/")
+  else:
+    with open(font_path, "rb") as f:
+      source = "data:font/ttf;base64," + base64.b64encode(f.read()).decode('utf-8')
+  font_css = f"""
+          @font-face {{
+              font-family: 'EmbeddedVoynich';
+              src: url('{source}') format('truetype');
+          }}
+          """
+  return font_css, "EmbeddedVoynich"
+
+
+def comparison_lines(text, settings):
+  return text.replace(settings["spaceDelimiter"], " ").replace(settings["ambiguousSpaceDelimiter"], " ").split("\n")
+
+
+def transcription_lines(text, settings):
+  """comparison_lines() of cleaned transcription text, whose words are still separated by '.' and ','."""
+  return comparison_lines(text.replace(".", " ").replace(",", " "), settings)
+
+
+def write_rows(reportFile, trans_lines, orig_lines):
+  """Writes one row per line pair straight to the file, skipping pairs that are both blank."""
+  escape = html_lib.escape
+  for t, o in zip(trans_lines, orig_lines):
+    if not t.strip() and not o.strip(): continue
+    reportFile.write(f"<div class='row'><div class='trans'>{escape(t)}</div><div class='orig'>{escape(o)}</div></div>")
+
+
+def write_report(path, trans_lines, orig_lines, font_css="", font_family="sans-serif", title="Comparison", nav=""):
+  with open(path, "w", encoding="utf-8") as reportFile:
+    reportFile.write(PAGE_HEAD.format(font_css=font_css, font_family=font_family, title=html_lib.escape(title)))
+    reportFile.write(nav)
+    reportFile.write("<div class='container'>")
+    write_rows(reportFile, trans_lines, orig_lines)
+    reportFile.write(PAGE_TAIL)
+
+
+def write_paginated_report(index_path, sections, trans_lines, orig_lines, font_path=None, font_mode="inline"):
+  """
+  Writes one page per section into a folder next to index_path, and an
+  index page at index_path linking to them. sections is a list of
+  (label, line count) covering the lines in order; a None label is
+  replaced by the section's line numbers.
+  """
+  folder = os.path.splitext(index_path)[0] + "_pages"
+  os.makedirs(folder, exist_ok=True)
+  # Pages of an earlier, differently split report would otherwise linger
+  for filename in os.listdir(folder):
+    if filename.endswith(".html"):
+      os.remove(os.path.join(folder, filename))
+  font_css, font_family = "", "sans-serif"
+  if font_path:
+    font_css, font_family = font_face(font_path, font_mode, folder)
+
+  pages = []
+  line = 0
+  for number, (label, count) in enumerate(sections, 1):
+    if label is None:
+      label = f"lines {line + 1}-{line + count}"
+    filename = f"{number:04d}_{''.join(c if c.isalnum() else '_' for c in label)}.html"
+    pages.append((label, filename, line, line + count))
+    line += count
+
+  for i, (label, filename, start, end) in enumerate(pages):
+    links = []
+    if i > 0:
+      links.append(f"<a href='{pages[i - 1][1]}'>&larr; {html_lib.escape(pages[i - 1][0])}</a>")
+    links.append(f"<a href='{os.path.relpath(index_path, folder).replace(os.sep, '/')}'>Index</a>")
+    if i + 1 < len(pages):
+      links.append(f"<a href='{pages[i + 1][1]}'>{html_lib.escape(pages[i + 1][0])} &rarr;</a>")
+    nav = "<p>" + " | ".join(links) + "</p>"
+    write_report(os.path.join(folder, filename), trans_lines[start:end], orig_lines[start:end],
+                 font_css, font_family, f"Comparison: {label}", nav)
+
+  relative_folder = os.path.relpath(folder, os.path.dirname(os.path.abspath(index_path))).replace(os.sep, "/")
+  with open(index_path, "w", encoding="utf-8") as indexFile:
+    indexFile.write(PAGE_HEAD.format(font_css="", font_family="sans-serif", title="Comparison"))
+    indexFile.write("<div class='container'>")
+    for label, filename, start, end in pages:
+      indexFile.write(f"<div class='row'><a href='{relative_folder}/{filename}'>{html_lib.escape(label)}</a>"
+                      f"&nbsp;({end - start} lines)</div>")
+    indexFile.write(PAGE_TAIL)
+  return folder
@@ -0,0 +1,88 @@
+# The Voynich Transliteration Tool
+# Cleaner Tests
+#
+# StreamCleaner has to give byte for byte the output of the whole-file
+# cleaning it replaced, on the bundled transcriptions and on spans that are
+# unclosed or run over several lines.
+#
+#   python -m unittest discover tests
+
+### Imports ###
+import contextlib
+import io
+import os
+import random
+import re
+import tempfile
+import unittest
+
+from cleaner import StreamCleaner, process_file
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RAW_TRANSCRIPTIONS = ("eva.txt", "v101.txt")
+
+
+def reference_clean(text):
+  """The whole-file cleaning cleaner.py did before StreamCleaner."""
+  text = "".join(line for line in text.splitlines(keepends=True) if not line.startswith("#"))
+  text = text.replace(" ", "")
+  text = re.sub(r"<[^>]*>", "", text)
+  text = re.sub(r"\{[^}]*\}", "", text)
+  text = re.sub(r"\[[^\]]*\]", "", text)
+  return text.replace("=", "").replace("-", "")
+
+
+def stream_clean(text):
+  cleaner = StreamCleaner()
+  cleaned = [cleaner.feed(line) for line in text.splitlines(keepends=True)]
+  cleaned.append(cleaner.finish())
+  return "".join(cleaned)
+
+
+class StreamCleanerTest(unittest.TestCase):
+
+  def test_bundled_transcriptions(self):
+    for name in RAW_TRANSCRIPTIONS:
+      with self.subTest(transcription=name):
+        with open(os.path.join(ROOT, name), "r", encoding="utf-8") as rawFile:
+          text = rawFile.read()
+        self.assertEqual(stream_clean(text), reference_clean(text))
+
+  def test_spans_across_lines(self):
+    cases = [
+      "<f1r.1>a.b{note\nstill note}c=\nd-e\n",
+      "a<open\n# comment inside\nb>c\n",
+      "a[x\ny{z\nw]v}u\n",
+      "a<never closed\nb.c\n",
+      "a{unclosed\n<f1r.2>b}c<d\n",
+      "x <a> y {b} z [c] w\n#last\n",
+      "no newline at the end<",
+      "{a<b}c>d\n",
+      "[a{b]c}d\n",
+      "<a[b>c]d{e\n}f\n",
+    ]
+    for text in cases:
+      with self.subTest(text=text):
+        self.assertEqual(stream_clean(text), reference_clean(text))
+
+  def test_random_text(self):
+    rng = random.Random(0)
+    for _ in range(2000):
+      text = "".join(rng.choice("ab.<>{}[]\n\n# =-") for _ in range(rng.randrange(40)))
+      with self.subTest(text=text):
+        self.assertEqual(stream_clean(text), reference_clean(text))
+
+  def test_process_file_output(self):
+    input_path = os.path.join(ROOT, "eva.txt")
+    with open(input_path, "r", encoding="utf-8") as rawFile:
+      expected = reference_clean(rawFile.read())
+    with tempfile.TemporaryDirectory() as folder:
+      output_path = os.path.join(folder, "eva_cleaned.txt")
+      with contextlib.redirect_stdout(io.StringIO()):
+        process_file(input_path, output_path)
+      with open(output_path, "rb") as cleanedFile:
+        self.assertEqual(cleanedFile.read(), expected.encode("utf-8"))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,90 @@
+# The Voynich Transliteration Tool
+# Fuzzy Matching Tests
+#
+# FuzzyIndex.best_match has to return what difflib.get_close_matches(word,
+# vocabulary, n=1, cutoff) returns, with and without NumPy, and an index
+# read back from the reference cache has to match like the one written.
+#
+#   python -m unittest discover tests
+
+### Imports ###
+import difflib
+import os
+import random
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+import fuzzy
+from fuzzy import FuzzyIndex, load_cache, write_cache
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VOCABULARY_SIZE = 3000
+QUERY_COUNT = 60
+# The word and merge cutoffs of toleranceLevel 1 to 3
+CUTOFFS = (0.7, 0.75, 0.8, 0.85)
+
+
+def words_of(name):
+  with open(os.path.join(ROOT, name), "r", encoding="utf-8") as cleanedFile:
+    return sorted(set(re.split(r"[.,\-=\s]+", cleanedFile.read())) - {""})
+
+
+def sample_queries(vocabulary, rng):
+  """Reference words, words with one edit, and words of the other transcription."""
+  queries = rng.sample(vocabulary, QUERY_COUNT // 3)
+  for word in rng.sample(vocabulary, QUERY_COUNT // 3):
+    i = rng.randrange(len(word))
+    queries.append(word[:i] + rng.choice("aeiotkl") + word[i + 1:])
+  queries.extend(rng.sample(words_of("v101_cleaned.txt"), QUERY_COUNT // 3))
+  return queries
+
+
+class FuzzyIndexTest(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    rng = random.Random(0)
+    cls.vocabulary = sorted(rng.sample(words_of("eva_cleaned.txt"), VOCABULARY_SIZE))
+    cls.queries = sample_queries(cls.vocabulary, rng)
+
+  def expected(self, word, cutoff):
+    matches = difflib.get_close_matches(word, self.vocabulary, n=1, cutoff=cutoff)
+    return matches[0] if matches else None
+
+  def assertMatchesDifflib(self, index):
+    for cutoff in CUTOFFS:
+      for word in self.queries:
+        with self.subTest(word=word, cutoff=cutoff):
+          best = index.best_match(word, cutoff)
+          self.assertEqual(best and best[1], self.expected(word, cutoff))
+
+  @unittest.skipIf(fuzzy.np is None, "NumPy is not installed")
+  def test_numpy_index(self):
+    self.assertMatchesDifflib(FuzzyIndex(self.vocabulary))
+
+  def test_postings_index(self):
+    with mock.patch.object(fuzzy, "np", None):
+      self.assertMatchesDifflib(FuzzyIndex(self.vocabulary))
+
+  def test_reference_cache(self):
+    signature = [["ref.txt", 1, 2]]
+    matches = {"2": {"words": {"daiin": ["dain", 89]}, "merges": {}}}
+    with tempfile.TemporaryDirectory() as folder:
+      cache_path = os.path.join(folder, "reference_cache.bin")
+      write_cache(cache_path, signature, FuzzyIndex(self.vocabulary), matches)
+      self.assertIsNone(load_cache(cache_path, [["ref.txt", 1, 3]]))
+      index, loaded_matches = load_cache(cache_path, signature)
+      self.assertEqual(loaded_matches, matches)
+      self.assertEqual(index.words, self.vocabulary)
+      self.assertMatchesDifflib(index)
+      # Rewriting the cache the index was loaded from
+      write_cache(cache_path, signature, index, matches)
+      index, _ = load_cache(cache_path, signature)
+      self.assertMatchesDifflib(index)
+      index.detach()
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,102 @@
+# The Voynich Transliteration Tool
+# Incremental Transliteration Tests
+#
+# After a mapping edit, TransliterationCache has to give the same output and
+# the same analysis counters as transliterating and counting from scratch,
+# whether it updates the previous run's counters or recounts.
+#
+#   python -m unittest discover tests
+
+### Imports ###
+import json
+import os
+import tempfile
+import unittest
+
+from analysis import TextStatistics
+from incremental import TransliterationCache
+from transliterator import DEFAULT_SETTINGS, TRANSCRIPTIONS, Transliterator, split_lines
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_LINES = 1500
+
+# Each edit is applied on top of the previous ones: rare glyphs (few lines
+# redone, counters updated), a glyph dropped from the output, a positional
+# rule, a glyph whose output holds a word delimiter, and a common glyph
+# (most lines redone, counters recounted).
+EDITS = [
+  {"v": "x"},
+  {"z": "", "u": "q"},
+  {"7": "n@", "8": "m/"},
+  {"j": "a_b"},
+  {"x": "", "v": "v"},
+  {"o": "u"},
+]
+
+
+def counters(stats):
+  return (list(stats.word_counts.items()), list(stats.reduplications.items()),
+          dict(stats.boundary_pairs), stats.newlines)
+
+
+class TransliterationCacheTest(unittest.TestCase):
+
+  def run_cached(self, cache_path, mapping, lines):
+    """One main.py run with the cache on. Returns (output, stats, whether the counters were updated)."""
+    transliterator = Transliterator(mapping, DEFAULT_SETTINGS)
+    cache = TransliterationCache(cache_path, mapping, DEFAULT_SETTINGS)
+    previous = cache.stats
+    output = cache.transliterate(lines, transliterator)
+    stats = cache.statistics(transliterator, output)
+    cache.write()
+    return output, stats, previous is not None and stats is previous
+
+  def run_full(self, mapping, lines):
+    transliterator = Transliterator(mapping, DEFAULT_SETTINGS)
+    glyph_text = transliterator.encode("".join(lines))
+    stats = TextStatistics()
+    stats.add_words(glyph_text.words())
+    output = glyph_text.text()
+    stats.newlines = output.count("\n")
+    return output, stats
+
+  def test_mapping_edits(self):
+    input_path, map_path = (os.path.join(ROOT, name) for name in TRANSCRIPTIONS["eva"])
+    with open(input_path, "r", encoding="utf-8") as inputFile:
+      lines = split_lines("".join(line for _, line in zip(range(SAMPLE_LINES), inputFile)))
+    with open(map_path, "r", encoding="utf-8") as mapFile:
+      mapping = json.load(mapFile)
+
+    updated = 0
+    with tempfile.TemporaryDirectory() as folder:
+      cache_path = os.path.join(folder, "transliteration_cache.json")
+      self.run_cached(cache_path, mapping, lines)
+      for edit in EDITS:
+        mapping = dict(mapping, **edit)
+        with self.subTest(edit=edit):
+          output, stats, was_updated = self.run_cached(cache_path, mapping, lines)
+          expected_output, expected_stats = self.run_full(mapping, lines)
+          self.assertEqual(output, expected_output)
+          self.assertEqual(counters(stats), counters(expected_stats))
+          updated += was_updated
+    # Most edits have to take the incremental path for the test to mean anything
+    self.assertGreaterEqual(updated, 3)
+
+  def test_only_the_last_selection_is_kept(self):
+    input_path, map_path = (os.path.join(ROOT, name) for name in TRANSCRIPTIONS["eva"])
+    with open(input_path, "r", encoding="utf-8") as inputFile:
+      lines = split_lines(inputFile.read())
+    with open(map_path, "r", encoding="utf-8") as mapFile:
+      mapping = json.load(mapFile)
+
+    with tempfile.TemporaryDirectory() as folder:
+      cache_path = os.path.join(folder, "transliteration_cache.json")
+      self.run_cached(cache_path, mapping, lines[:2000])
+      output, _, _ = self.run_cached(cache_path, mapping, lines[2000:2100])
+      self.assertEqual(output, self.run_full(mapping, lines[2000:2100])[0])
+      with open(cache_path, "r", encoding="utf-8") as cacheFile:
+        self.assertEqual(set(json.load(cacheFile)["lines"]), set(lines[2000:2100]))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,27 @@
+# The Voynich Transliteration Tool
+# Startup Budget Test
+#
+# A cold `python main.py` on a few lines with every feature off has to stay
+# within benchmark.STARTUP_BUDGET_MS of a bare interpreter start.
+#
+#   python -m unittest discover tests
+
+### Imports ###
+import unittest
+
+from benchmark import STARTUP_BUDGET_MS, startup_check
+from transliterator import TRANSCRIPTIONS
+
+
+class StartupBudgetTest(unittest.TestCase):
+
+  def test_main_starts_within_budget(self):
+    for transcription in TRANSCRIPTIONS:
+      with self.subTest(transcription=transcription):
+        milliseconds, slowest = startup_check(transcription, repeat=5)
+        imports = ", ".join(f"{name} {ms:.1f}ms" for name, ms in slowest)
+        self.assertLessEqual(milliseconds, STARTUP_BUDGET_MS, f"slowest imports: {imports}")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,120 @@
+# The Voynich Transliteration Tool
+# Transliteration Engine Tests
+#
+# The compiled trie has to give the same output as matching the mapping's
+# glyphs by brute force, longest first, on the bundled transcriptions and on
+# mappings with multi-glyph keys and positional/occurrence rules. Input
+# sharded across worker processes has to come out as it does in-process.
+#
+#   python -m unittest discover tests
+
+### Imports ###
+import json
+import multiprocessing
+import os
+import unittest
+from collections import Counter
+from unittest import mock
+
+import transliterator
+from transliterator import (DEFAULT_SETTINGS, TRANSCRIPTIONS, Transliterator, compile_word_pattern,
+                            delimiter_table, parse_rule, rule_applies, split_lines)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SAMPLE_LINES = 400
+
+
+def read_sample(transcription, lines=SAMPLE_LINES):
+  input_path, map_path = (os.path.join(ROOT, name) for name in TRANSCRIPTIONS[transcription])
+  with open(input_path, "r", encoding="utf-8") as inputFile:
+    text = inputFile.read() if lines is None else "".join(line for _, line in zip(range(lines), inputFile))
+  with open(map_path, "r", encoding="utf-8") as mapFile:
+    return text, json.load(mapFile)
+
+
+def reference_transliterate(mapping, text, settings=DEFAULT_SETTINGS):
+  """
+  Transliterates text by trying every substring of a word against the
+  mapping, longest first, the way main.py matched glyphs before the trie.
+  """
+  delimiters = delimiter_table(settings)
+  longest = max(map(len, mapping))
+  out = []
+  i = 0
+  for m in compile_word_pattern(delimiters).finditer(text):
+    start, end = m.span()
+    out.append("".join(delimiters[ch] for ch in text[i:start]))
+    i = end
+    occurrences = {}
+    j = start
+    while j < end:
+      for length in range(min(longest, end - j), 0, -1):
+        glyph = text[j:j + length]
+        if glyph in mapping: break
+      else:
+        glyph = text[j]
+      occurrences[glyph] = occurrences.get(glyph, 0) + 1
+      if glyph in mapping:
+        value = mapping[glyph]
+        if rule_applies(parse_rule(value, settings), j == start, j + len(glyph) == end, occurrences[glyph]):
+          out.append(value.strip(settings["endOfWordMarker"]).strip(settings["startOfWordMarker"]))
+      j += len(glyph)
+  out.append("".join(delimiters[ch] for ch in text[i:]))
+  return "".join(out)
+
+
+class TrieMatchTest(unittest.TestCase):
+
+  def test_bundled_transcriptions(self):
+    for transcription in TRANSCRIPTIONS:
+      with self.subTest(transcription=transcription):
+        text, mapping = read_sample(transcription)
+        self.assertEqual(Transliterator(mapping).transliterate(text), reference_transliterate(mapping, text))
+
+  def test_multi_glyph_keys_and_rules(self):
+    mapping = {"c": "k", "ch": "x", "cth": "T", "o": "a@", "y": "i/", "d": "t'", "a": "e\"", "i": "j",
+               "ii": "J:", "iin": "N", "e": "E;", "q": "", "4o": "QU"}
+    text = "qokeedy.chol,cthy.daiin.dd.dddd.ddddd\n4ochodaiiin.oo,iiii.eeeee.cc\nc.h_t-cthh\n"
+    self.assertEqual(Transliterator(mapping).transliterate(text), reference_transliterate(mapping, text))
+
+
+
+@unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "Shards need fork")
+class ShardTest(unittest.TestCase):
+  """The whole of each transcription, sharded however small it is."""
+
+  def setUp(self):
+    patcher = mock.patch.object(transliterator, "PARALLEL_MIN_CHARS", 1)
+    patcher.start()
+    self.addCleanup(patcher.stop)
+
+  def transliterators(self, mapping):
+    sharded, in_process = Transliterator(mapping), Transliterator(mapping)
+    sharded.glyph_counts, in_process.glyph_counts = Counter(), Counter()
+    return sharded, in_process
+
+  def test_encode_text(self):
+    for transcription in TRANSCRIPTIONS:
+      with self.subTest(transcription=transcription):
+        text, mapping = read_sample(transcription, lines=None)
+        self.assertIsNotNone(transliterator.text_shards(text, 3))
+        sharded, in_process = self.transliterators(mapping)
+        expected = in_process.encode(text)
+        glyph_text = sharded.encode_text(text, workers=3)
+        self.assertEqual(glyph_text.text(), expected.text())
+        self.assertEqual(list(glyph_text.words()), list(expected.words()))
+        self.assertEqual(sharded.glyph_counts, in_process.glyph_counts)
+        # Every word is looked up in some worker's cache exactly once
+        lookups = sharded.word_cache.hits + sharded.word_cache.misses
+        self.assertEqual(lookups, in_process.word_cache.hits + in_process.word_cache.misses)
+
+  def test_transliterate_lines(self):
+    text, mapping = read_sample("eva", lines=None)
+    lines = split_lines(text)
+    sharded, in_process = self.transliterators(mapping)
+    self.assertEqual(sharded.transliterate_lines(lines, workers=3), [in_process.transliterate(line) for line in lines])
+    self.assertEqual(sharded.glyph_counts, in_process.glyph_counts)
+
+
+if __name__ == "__main__":
+  unittest.main()
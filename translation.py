@@ -0,0 +1,219 @@
+# The Voynich Transliteration Tool
+# Translation
+#
+# Machine translation of the transliterated output. The text is split into
+# chunks on line and word boundaries, chunks are sent to a backend a few at
+# a time, and every translated chunk is cached by its hash so unchanged text
+# is never sent again.
+
+### Imports ###
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_VERSION = 1
+
+# Largest chunk Google Translate accepts, with some headroom
+CHUNK_SIZE = 4900
+
+
+### Backends ###
+class TranslationBackend(ABC):
+  """Translates one chunk of text. Subclasses must be safe to call from several threads at once."""
+
+  name = None
+
+  @abstractmethod
+  def translate(self, text, source, target):
+    """Returns the translation of text from the source to the target language."""
+
+  def supported_languages(self):
+    return {}
+
+
+class GoogleBackend(TranslationBackend):
+  """Google Translate through deep_translator. Raises ImportError if it is not installed."""
+
+  name = "google"
+
+  def __init__(self):
+    from deep_translator import GoogleTranslator
+    self.translator_class = GoogleTranslator
+    self.local = threading.local()
+
+  def translate(self, text, source, target):
+    # One translator (and HTTP session) per thread and language pair, reused for every chunk it sends.
+    # Keyed by the languages as given, since the translator keeps them normalised to codes
+    translators = getattr(self.local, "translators", None)
+    if translators is None:
+      translators = self.local.translators = {}
+    translator = translators.get((source, target))
+    if translator is None:
+      translator = translators[(source, target)] = self.translator_class(source=source, target=target)
+    return translator.translate(text=text)
+
+  def supported_languages(self):
+    return self.translator_class().get_supported_languages(as_dict=True)
+
+
+class LocalBackend(TranslationBackend):
+  """
+  Offline stand-in that returns every chunk unchanged after an optional
+  delay, for trying the translation stage without a network connection.
+  """
+
+  name = "local"
+
+  def __init__(self, delay=0.0):
+    self.delay = delay
+
+  def translate(self, text, source, target):
+    if self.delay:
+      time.sleep(self.delay)
+    return text
+
+
+BACKENDS = {backend.name: backend for backend in (GoogleBackend, LocalBackend)}
+
+
+def get_backend(name):
+  if name not in BACKENDS:
+    raise ValueError(f"Unknown translation backend '{name}' (expected one of: {', '.join(BACKENDS)})")
+  return BACKENDS[name]()
+
+
+### Chunking ###
+def split_chunks(text, max_chars=CHUNK_SIZE):
+  """
+  Splits text into (chunk, separator) pairs of at most max_chars, where
+  separator is what joins the chunk's translation to the next one. Chunks
+  hold whole lines where possible; a longer line is split between words,
+  and only a single word longer than max_chars is cut.
+  """
+  chunks = []
+  lines = []
+  size = 0
+
+  def flush():
+    nonlocal lines, size
+    if lines:
+      chunks.append(("\n".join(lines), "\n"))
+    lines = []
+    size = 0
+
+  for line in text.split("\n"):
+    if len(line) > max_chars:
+      flush()
+      words = []
+      word_size = 0
+      for word in line.split():
+        while len(word) > max_chars:
+          if words:
+            chunks.append((" ".join(words), " "))
+            words, word_size = [], 0
+          chunks.append((word[:max_chars], ""))
+          word = word[max_chars:]
+        if word_size + len(word) + bool(words) > max_chars:
+          chunks.append((" ".join(words), " "))
+          words, word_size = [], 0
+        word_size += len(word) + bool(words)
+        words.append(word)
+      if words:
+        chunks.append((" ".join(words), "\n"))
+      elif chunks:
+        chunks[-1] = (chunks[-1][0], "\n")
+      continue
+    if size + len(line) + bool(lines) > max_chars:
+      flush()
+    size += len(line) + bool(lines)
+    lines.append(line)
+  flush()
+  return [(chunk, separator) for chunk, separator in chunks if chunk.strip()]
+
+
+### Cache ###
+class TranslationCache:
+  """Translated chunks of earlier runs, keyed by a hash of the backend, languages and chunk text."""
+
+  def __init__(self, cache_path):
+    self.cache_path = cache_path
+    self.entries = {}
+    self.added = 0
+    if cache_path and os.path.exists(cache_path):
+      try:
+        with open(cache_path, "r", encoding="utf-8") as cacheFile:
+          cache = json.load(cacheFile)
+        if cache.get("version") == CACHE_VERSION:
+          self.entries = cache["entries"]
+      except (OSError, ValueError):
+        pass
+
+  @staticmethod
+  def key(backend, source, target, chunk):
+    return hashlib.sha1(f"{backend}\0{source}\0{target}\0{chunk}".encode("utf-8")).hexdigest()
+
+  def get(self, key):
+    return self.entries.get(key)
+
+  def put(self, key, translation):
+    self.entries[key] = translation
+    self.added += 1
+
+  def write(self):
+    if not self.cache_path or not self.added: return
+    with open(self.cache_path, "w", encoding="utf-8") as cacheFile:
+      json.dump({"version": CACHE_VERSION, "entries": self.entries}, cacheFile, ensure_ascii=False)
+
+
+### Translation ###
+def translate_text(text, backend, source, target, output_path, cache=None, workers=4, max_chars=CHUNK_SIZE):
+  """
+  Translates text chunk by chunk into output_path. Cached chunks are reused,
+  the rest are sent to the backend by up to `workers` threads, and
+  translations are written in text order as they arrive. A chunk that fails
+  is left out of the output and not cached, so the next run retries it.
+  Returns a dict of chunk counts and a list of (chunk number, error) pairs.
+  """
+  chunks = split_chunks(text, max_chars)
+  keys = [TranslationCache.key(backend.name, source, target, chunk) for chunk, separator in chunks]
+  cached = {}
+  if cache is not None:
+    cached = {key: cache.get(key) for key in keys if cache.get(key) is not None}
+
+  # Identical chunks are only sent once
+  pending = {}
+  numbers = {}
+  for number, (key, (chunk, separator)) in enumerate(zip(keys, chunks), 1):
+    if key not in cached and key not in pending:
+      pending[key] = chunk
+      numbers[key] = number
+
+  def send(key):
+    try:
+      return key, backend.translate(pending[key], source, target), None
+    except Exception as e:
+      return key, None, e
+
+  counts = {"chunks": len(chunks), "cached": sum(key in cached for key in keys), "sent": len(pending), "failed": 0}
+  errors = []
+  with open(output_path, "w", encoding="utf-8") as translateFile, \
+       ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+    results = dict(cached)
+    arrivals = executor.map(send, list(pending))
+    for key, (chunk, separator) in zip(keys, chunks):
+      # Wait for this chunk's translation; later chunks keep translating meanwhile
+      while key not in results:
+        sent_key, translation, error = next(arrivals)
+        results[sent_key] = translation
+        if error is not None:
+          errors.append((numbers[sent_key], error))
+          counts["failed"] += 1
+        elif cache is not None:
+          cache.put(sent_key, translation)
+      if results[key] is None: continue
+      translateFile.write(results[key] + separator)
+  return counts, errors
@@ -0,0 +1,568 @@
+# The Voynich Transliteration Tool
+# Transliteration Engine
+#
+# Compiles a v101/EVA mapping once and applies it to any number of texts.
+# Importing this module has no side effects; main.py and batch jobs share it.
+
+### Imports ###
+import json
+import re
+from array import array
+from collections import Counter, OrderedDict
+
+### Settings ###
+# Defaults for the config.json keys the engine reads.
+DEFAULT_SETTINGS = {
+  "spaceDelimiter": "_",
+  "ambiguousSpaceDelimiter": "-",
+  "endOfWordMarker": "/",
+  "startOfWordMarker": "@",
+  "firstOccuranceMarker": "'",
+  "secondOccuranceMarker": "\"",
+  "thirdOccuranceMarker": ":",
+  "fourthOccuranceMarker": ";",
+}
+
+# Cleaned input and mapping file for each config["transliteration"] value.
+TRANSCRIPTIONS = {
+  "v101": ("v101_cleaned.txt", "v101_mapping.json"),
+  "eva": ("eva_cleaned.txt", "eva_mapping.json"),
+}
+
+# Word separators used by the cleaned transcriptions.
+TRANSCRIPTION_SPACE = "."
+TRANSCRIPTION_AMBIGUOUS_SPACE = ","
+
+# Characters of the cleaned transcriptions that are not glyphs: word
+# separators, line ends and the line-continuation marks left in v101.
+NON_GLYPHS = frozenset(".,-=\n")
+
+# Rule applied to a glyph. Occurrence rules equal the occurrence they match.
+RULE_NORMAL = 0
+RULE_FIRST = 1
+RULE_SECOND = 2
+RULE_THIRD = 3
+RULE_FOURTH = 4
+RULE_INITIAL = 5
+RULE_FINAL = 6
+RULE_NAMES = ("normal", "first", "second", "third", "fourth", "initial", "final")
+
+# Distinct words whose glyph codes are memoized (EVA and v101 have under 10k)
+WORD_CACHE_SIZE = 65536
+
+
+def delimiter_table(settings):
+  """Maps every input word separator to the output delimiter it becomes."""
+  space = settings["spaceDelimiter"]
+  ambiguous = settings["ambiguousSpaceDelimiter"]
+  return {TRANSCRIPTION_SPACE: space, TRANSCRIPTION_AMBIGUOUS_SPACE: ambiguous,
+          space: space, ambiguous: ambiguous, "\n": "\n"}
+
+
+def compile_word_pattern(delimiters):
+  """Regex matching each maximal run of characters that are not delimiters."""
+  return re.compile("[^" + "".join(re.escape(d) for d in delimiters) + "]+")
+
+
+def split_lines(text):
+  """
+  The lines of text with their line ends, as iterating over the file gives
+  them. Unlike str.splitlines(), only newlines end a line.
+  """
+  lines = text.split("\n")
+  last = lines.pop()
+  lines = [line + "\n" for line in lines]
+  if last:
+    lines.append(last)
+  return lines
+
+
+def count_lines(text):
+  return text.count("\n") + (bool(text) and not text.endswith("\n"))
+
+
+def glyph_inventory(text, counts=None):
+  """
+  Counts every glyph of cleaned transcription text in one pass and returns
+  the Counter; sorted(counts) is the alphabet. Separators and whitespace are
+  left out. Pass counts to add text to an existing inventory, e.g. one chunk
+  or file at a time.
+  """
+  if counts is None:
+    counts = Counter()
+  counts.update(text)
+  for char in [c for c in counts if c in NON_GLYPHS or c.isspace()]:
+    del counts[char]
+  return counts
+
+
+def parse_rule(value, settings):
+  """Returns the rule selected by the position/occurrence markers of a mapping value."""
+  rule = None
+  for marker, marker_rule in (("startOfWordMarker", RULE_INITIAL),
+                              ("endOfWordMarker", RULE_FINAL),
+                              ("firstOccuranceMarker", RULE_FIRST),
+                              ("secondOccuranceMarker", RULE_SECOND),
+                              ("thirdOccuranceMarker", RULE_THIRD),
+                              ("fourthOccuranceMarker", RULE_FOURTH)):
+    if value.endswith(settings[marker]):
+      value = value[:-1]
+      if rule is None:
+        rule = marker_rule
+  return RULE_NORMAL if rule is None else rule
+
+
+def rule_applies(rule, at_start, at_end, occurrence):
+  if rule == RULE_INITIAL: return at_start
+  if rule == RULE_FINAL: return at_end
+  return rule == RULE_NORMAL or rule == occurrence
+
+
+### Word Cache ###
+class WordCache:
+  """
+  The glyph codes and glyph counts of each word encoded so far, evicting the
+  least recently used word once maxsize words are stored. A word's codes
+  only depend on its own glyphs, since positions and occurrence counts
+  restart at every word, so a stored word never goes stale.
+  """
+
+  def __init__(self, maxsize=WORD_CACHE_SIZE):
+    self.maxsize = maxsize
+    self.entries = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+    self.evictions = 0
+
+  def get(self, word):
+    entry = self.entries.get(word)
+    if entry is None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    self.entries.move_to_end(word)
+    return entry
+
+  def put(self, word, entry):
+    self.entries[word] = entry
+    if len(self.entries) > self.maxsize:
+      self.entries.popitem(last=False)
+      self.evictions += 1
+
+  def take_counts(self):
+    """Returns the hit, miss and eviction counts since the last call, and starts them again from 0."""
+    counts = {"hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+    self.hits = self.misses = self.evictions = 0
+    return counts
+
+  def add_counts(self, counts):
+    """Adds the counts of a copy of this cache, e.g. a worker process's."""
+    self.hits += counts["hits"]
+    self.misses += counts["misses"]
+    self.evictions += counts["evictions"]
+
+  def hit_rate(self):
+    lookups = self.hits + self.misses
+    return self.hits / lookups if lookups else 0.0
+
+  def stats(self):
+    """Returns the hit, miss and eviction counts and the current and maximum size."""
+    return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+            "size": len(self.entries), "maxsize": self.maxsize}
+
+  def clear(self):
+    self.entries.clear()
+    self.hits = self.misses = self.evictions = 0
+
+
+### Transliterator ###
+class Transliterator:
+  """
+  A mapping compiled into one table shared by every positional/occurrence
+  rule. Each glyph maps to a (code, rule, output) entry, and the entries are
+  stored in a longest-match trie so a glyph and its entry are found in a
+  single walk of the input. Encoded words are memoized in a WordCache of
+  word_cache_size words (0 turns it off).
+  """
+
+  def __init__(self, mapping, settings=None, glyphs=None, word_cache_size=WORD_CACHE_SIZE):
+    self.settings = dict(DEFAULT_SETTINGS)
+    if settings:
+      self.settings.update({k: v for k, v in settings.items() if k in DEFAULT_SETTINGS})
+
+    space = self.settings["spaceDelimiter"]
+    ambiguous = self.settings["ambiguousSpaceDelimiter"]
+    self.delimiters = delimiter_table(self.settings)
+    self.word_pattern = compile_word_pattern(self.delimiters)
+    self.output_word_pattern = compile_word_pattern((space, ambiguous, "\n"))
+    # Set to a Counter to count the glyphs transliterate() emits per rule
+    self.glyph_counts = None
+    self.word_cache = WordCache(word_cache_size) if word_cache_size > 0 else None
+
+    if glyphs is None:
+      glyphs = sorted(mapping)
+
+    # glyph -> (code, rule, output); outputs[code] is the output of each code
+    self.table = {}
+    self.outputs = []
+    for code, glyph in enumerate(glyphs):
+      value = mapping[glyph]
+      output = value.strip(self.settings["endOfWordMarker"]).strip(self.settings["startOfWordMarker"])
+      self.table[glyph] = (code, parse_rule(value, self.settings), output)
+      self.outputs.append(output)
+
+    # Only needed to split words when an output holds a delimiter
+    self.split_pattern = None
+    if any(self.output_word_pattern.fullmatch(output) is None for output in self.outputs if output):
+      self.split_pattern = self.output_word_pattern
+
+    self.trie = {}
+    for glyph, entry in self.table.items():
+      node = self.trie
+      for c in glyph:
+        node = node.setdefault(c, {})
+      node[None] = entry
+
+  @classmethod
+  def from_file(cls, map_path, settings=None, glyphs=None, word_cache_size=WORD_CACHE_SIZE):
+    with open(map_path, "r", encoding="utf-8") as mapFile:
+      return cls(json.load(mapFile), settings, glyphs, word_cache_size)
+
+  def match_glyph(self, data, index, end):
+    """Returns (length, entry) of the longest mapped glyph in data[index:end]."""
+    node = self.trie
+    match_len = 0
+    entry = None
+    j = index
+    while j < end:
+      node = node.get(data[j])
+      if node is None: break
+      j += 1
+      if None in node:
+        match_len = j - index
+        entry = node[None]
+    return match_len, entry
+
+  def split_words(self, output):
+    """Returns every word of transliterated output, split on the delimiters and newlines."""
+    return self.output_word_pattern.findall(output)
+
+  def iter_words(self, output):
+    """Yields the words of transliterated output one at a time."""
+    for m in self.output_word_pattern.finditer(output):
+      yield m.group()
+
+  def encode(self, text):
+    """
+    Transliterates cleaned transcription text into a GlyphText: the code of
+    every glyph emitted, plus the word and delimiter layout, without building
+    the output string or a tuple per glyph. A word seen before is copied
+    from the word cache instead of being matched glyph by glyph.
+    """
+    delimiters = self.delimiters
+    counts = self.glyph_counts
+    cache = self.word_cache
+    cache_get = cache.get if cache is not None else None
+    match_glyph = self.match_glyph
+    codes = array("H")
+    word_lengths = array("I")
+    gaps = array("H")
+    gap_ids = {}
+    gap_strings = []
+
+    def gap_id(gap):
+      gid = gap_ids.get(gap)
+      if gid is None:
+        gid = gap_ids[gap] = len(gap_strings)
+        gap_strings.append("".join(delimiters[ch] for ch in gap))
+      return gid
+
+    # Glyph counts of the current word, kept whenever they are counted or cached
+    word_counts = None
+    i = 0
+    for m in self.word_pattern.finditer(text):
+      start, end = m.span()
+      gaps.append(gap_id(text[i:start]))
+      i = end
+      if cache is not None:
+        word = m.group()
+        cached = cache_get(word)
+        if cached is not None:
+          word_codes, word_counts = cached
+          codes.extend(word_codes)
+          word_lengths.append(len(word_codes))
+          if counts is not None: counts.update(word_counts)
+          continue
+      if counts is not None or cache is not None:
+        word_counts = {}
+      word_char_counts = {}
+      word_start = len(codes)
+      j = start
+      while j < end:
+        match_len, entry = match_glyph(text, j, end)
+        if entry is None:
+          match_len = 1
+        match_str = text[j:j + match_len]
+        occurrence = word_char_counts.get(match_str, 0) + 1
+        word_char_counts[match_str] = occurrence
+        if entry is None:
+          name = "unmapped"
+        elif rule_applies(entry[1], j == start, j + match_len == end, occurrence):
+          codes.append(entry[0])
+          name = RULE_NAMES[entry[1]]
+        else:
+          name = "skipped"
+        if word_counts is not None:
+          word_counts[name] = word_counts.get(name, 0) + 1
+        j += match_len
+      word_lengths.append(len(codes) - word_start)
+      if counts is not None: counts.update(word_counts)
+      if cache is not None: cache.put(word, (codes[word_start:], word_counts))
+    gaps.append(gap_id(text[i:]))
+    return GlyphText(self.outputs, codes, word_lengths, gaps, gap_strings, self.split_pattern)
+
+  def transliterate(self, text):
+    """Transliterates cleaned transcription text. Word separators become the configured delimiters."""
+    return self.encode(text).text()
+
+  def encode_lines(self, lines, workers=1):
+    """
+    Encodes the concatenated lines. Lines are independent (occurrence counts
+    reset at every word), so large inputs are cut into shards of whole
+    lines, encoded by forked worker processes that share this compiled
+    mapping, and joined back in order.
+    """
+    shards = line_shards(lines, workers)
+    if shards is None:
+      return self.encode("".join(lines))
+    return self.encode_shards(("".join(shard) for shard in shards), workers)
+
+  def encode_text(self, text, workers=1):
+    """encode_lines() for text that is already in one piece: shards are cut from it after newlines."""
+    shards = text_shards(text, workers)
+    if shards is None:
+      return self.encode(text)
+    return self.encode_shards(shards, workers)
+
+  def encode_shards(self, shards, workers):
+    parts = []
+    for codes, word_lengths, gaps, gap_strings in self.run_shards(encode_shard, shards, workers):
+      parts.append(GlyphText(self.outputs, codes, word_lengths, gaps, gap_strings, self.split_pattern))
+    return GlyphText.concat(parts)
+
+  def transliterate_lines(self, lines, workers=1):
+    """Returns the transliteration of each line, sharded across worker processes like encode_lines()."""
+    shards = line_shards(lines, workers)
+    if shards is None:
+      return [self.transliterate(line) for line in lines]
+    outputs = []
+    for shard_outputs in self.run_shards(transliterate_shard, shards, workers):
+      outputs.extend(shard_outputs)
+    return outputs
+
+  def run_shards(self, work, shards, workers):
+    """
+    Yields work(shard) for every shard in order, adding each shard's glyph
+    counts to glyph_counts and its word cache hits and misses to word_cache.
+    """
+    import multiprocessing
+    context = multiprocessing.get_context("fork")
+    with context.Pool(workers, initializer=init_worker, initargs=(self,)) as pool:
+      for result, (counts, cache_counts) in pool.imap(work, shards):
+        if counts is not None:
+          self.glyph_counts.update(counts)
+        if cache_counts is not None:
+          self.word_cache.add_counts(cache_counts)
+        yield result
+
+  def transliterate_iter(self, lines):
+    """Yields the transliteration of each line. Lines are independent, so this streams."""
+    for line in lines:
+      yield self.transliterate(line)
+
+
+### Parallel Transliteration ###
+# Less text than this is transliterated in-process; a pool would cost more than it saves
+PARALLEL_MIN_CHARS = 1 << 20
+# A few shards per worker evens out shards that take longer than others
+SHARDS_PER_WORKER = 4
+
+worker_transliterator = None
+
+
+def use_pool(chars, workers):
+  """
+  Whether chars of text are worth processing in a pool: not for one worker,
+  small inputs, or where fork (which shares the compiled mapping) is unavailable.
+  """
+  if workers <= 1 or chars < PARALLEL_MIN_CHARS:
+    return False
+  # Imported here: most runs never start a pool
+  import multiprocessing
+  return "fork" in multiprocessing.get_all_start_methods()
+
+
+def line_shards(lines, workers):
+  """Splits lines into runs of whole lines for the workers, or returns None when use_pool() says no."""
+  if not use_pool(sum(map(len, lines)), workers):
+    return None
+  shard_lines = -(-len(lines) // (workers * SHARDS_PER_WORKER))
+  return [lines[i:i + shard_lines] for i in range(0, len(lines), shard_lines)]
+
+
+def text_shards(text, workers):
+  """
+  Like line_shards() for text in one piece: yields slices of about equal
+  size, each cut after a newline. None when use_pool() says no.
+  """
+  if not use_pool(len(text), workers):
+    return None
+  shard_chars = -(-len(text) // (workers * SHARDS_PER_WORKER))
+
+  def shards():
+    start = 0
+    while start < len(text):
+      end = text.find("\n", start + shard_chars) + 1 or len(text)
+      yield text[start:end]
+      start = end
+
+  return shards()
+
+
+def init_worker(transliterator):
+  global worker_transliterator
+  worker_transliterator = transliterator
+
+
+def shard_counts():
+  """
+  Starts fresh glyph counts and word cache counts for the next shard,
+  returning the previous shard's. The worker's word cache itself is kept,
+  so words it has seen stay cached for its later shards.
+  """
+  counts = worker_transliterator.glyph_counts
+  if counts is not None:
+    worker_transliterator.glyph_counts = Counter()
+  cache = worker_transliterator.word_cache
+  return counts, cache.take_counts() if cache is not None else None
+
+
+def encode_shard(text):
+  """Encodes one shard in a worker. Returns the GlyphText arrays and the shard's glyph counts."""
+  shard_counts()
+  glyph_text = worker_transliterator.encode(text)
+  return (glyph_text.codes, glyph_text.word_lengths, glyph_text.gaps, glyph_text.gap_strings), shard_counts()
+
+
+def transliterate_shard(lines):
+  shard_counts()
+  outputs = [worker_transliterator.transliterate(line) for line in lines]
+  return outputs, shard_counts()
+
+
+### Encoded Output ###
+class GlyphText:
+  """
+  Transliterated text held as glyph codes. codes is the code of every glyph
+  emitted, word_lengths the number of codes in each word, and gaps[n] the
+  delimiters before word n (the last entry follows the last word) as an
+  index into gap_strings. word_pattern re-splits word outputs, and is None
+  when no glyph's output holds a delimiter. The string of each distinct
+  word is built once, and the text forms are only built when asked for.
+  """
+
+  def __init__(self, outputs, codes, word_lengths, gaps, gap_strings, word_pattern):
+    self.outputs = outputs
+    self.codes = codes
+    self.word_lengths = word_lengths
+    self.gaps = gaps
+    self.gap_strings = gap_strings
+    self.word_pattern = word_pattern
+    self.word_strings = {}
+
+  def __len__(self):
+    return len(self.word_lengths)
+
+  @classmethod
+  def concat(cls, parts):
+    """
+    Joins the GlyphTexts of consecutive pieces of one text, as if it had been
+    encoded whole. The pieces must be cut between words, e.g. after a line.
+    """
+    codes = array("H")
+    word_lengths = array("I")
+    gaps = array("H")
+    gap_ids = {}
+    gap_strings = []
+
+    def gap_id(gap):
+      gid = gap_ids.get(gap)
+      if gid is None:
+        gid = gap_ids[gap] = len(gap_strings)
+        gap_strings.append(gap)
+      return gid
+
+    # Delimiters after the last word so far, joined to the next part's leading ones
+    carried = ""
+    for part in parts:
+      if len(part):
+        remap = [gap_id(gap) for gap in part.gap_strings]
+        gaps.append(gap_id(carried + part.gap_strings[part.gaps[0]]))
+        # Parts usually find the same gaps in the same order, so ids rarely need remapping
+        if remap == list(range(len(remap))):
+          gaps.extend(part.gaps[1:-1])
+        else:
+          gaps.extend(map(remap.__getitem__, part.gaps[1:-1]))
+        word_lengths.extend(part.word_lengths)
+        codes.extend(part.codes)
+        carried = ""
+      carried += part.gap_strings[part.gaps[-1]]
+    gaps.append(gap_id(carried))
+    first = parts[0]
+    return cls(first.outputs, codes, word_lengths, gaps, gap_strings, first.word_pattern)
+
+  def word_strings_of(self):
+    """Yields the output of every word, including empty ones, in order."""
+    outputs = self.outputs
+    codes = self.codes
+    data = codes.tobytes()
+    size = codes.itemsize
+    memo = self.word_strings
+    start = 0
+    for length in self.word_lengths:
+      end = start + length
+      key = data[start * size:end * size]
+      word = memo.get(key)
+      if word is None:
+        word = memo[key] = "".join([outputs[code] for code in codes[start:end]])
+      yield word
+      start = end
+
+  def chunks(self):
+    """Yields the delimiters and word outputs in text order."""
+    gap_strings = self.gap_strings
+    for gap, word in zip(self.gaps, self.word_strings_of()):
+      yield gap_strings[gap]
+      yield word
+    yield gap_strings[self.gaps[-1]]
+
+  def text(self):
+    return "".join(self.chunks())
+
+  def words(self):
+    """
+    Yields the words of the output, the same as Transliterator.iter_words()
+    on text(). Gaps only hold delimiters, so words never span them.
+    """
+    if self.word_pattern is None:
+      for word in self.word_strings_of():
+        if word: yield word
+      return
+    # Some glyph's output holds a delimiter, so a word's output can split in two
+    split = self.word_pattern.findall
+    split_words = {}
+    for word in self.word_strings_of():
+      parts = split_words.get(word)
+      if parts is None:
+        parts = split_words[word] = split(word)
+      yield from parts
@@ -0,0 +1,96 @@
+# The Voynich Transliteration Tool
+# Zipf's Law Plot
+#
+# Draws the rank/frequency plot from log-binned points with matplotlib's
+# object API, so it needs no display and can run in worker processes. The
+# plotted data is hashed into the PNG's metadata, and a plot that would come
+# out the same is not drawn again (nor is matplotlib imported).
+
+### Imports ###
+import hashlib
+import json
+import struct
+
+from analysis import zipf_points
+
+PLOT_VERSION = 1
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+SIGNATURE_KEY = "VTT Zipf"
+
+# (label, exponent, color, line style) of the reference lines
+REFERENCES = [("Modern English", 1.00, "grey", "--"),
+              ("Middle High German", 1.03, "green", ":"),
+              ("Old French/Italian", 1.06, "orange", "-."),
+              ("Old English", 1.08, "purple", ":"),
+              ("Latin", 1.15, "yellow", "-.")]
+
+
+def png_text(path):
+  """The tEXt entries of a PNG file, read without an image library. {} if it cannot be read."""
+  entries = {}
+  try:
+    with open(path, "rb") as pngFile:
+      if pngFile.read(8) != PNG_SIGNATURE: return entries
+      while True:
+        header = pngFile.read(8)
+        if len(header) < 8: break
+        length, kind = struct.unpack(">I4s", header)
+        # Text chunks that matter come before the image data
+        if kind in (b"IDAT", b"IEND"): break
+        data = pngFile.read(length)
+        pngFile.seek(4, 1)
+        if kind == b"tEXt":
+          key, _, value = data.partition(b"\0")
+          entries[key.decode("latin-1")] = value.decode("latin-1")
+  except (OSError, struct.error):
+    pass
+  return entries
+
+
+def plot_zipf(word_counts, path, reference_lines=False, bins_per_decade=20, fit=None):
+  """
+  Writes the Zipf plot of word_counts to path, unless path already holds the
+  same plot. fit is the (exponent, r_squared) shown in the legend. Returns
+  True when the plot was drawn. Raises ImportError without NumPy/matplotlib.
+  """
+  ranks, frequencies = zipf_points(word_counts, bins_per_decade)
+  if not len(ranks): return False
+  signature = hashlib.sha1(json.dumps([PLOT_VERSION, reference_lines, fit, ranks.tolist(), frequencies.tolist()])
+                           .encode("utf-8")).hexdigest()
+  if png_text(path).get(SIGNATURE_KEY) == signature: return False
+
+  from matplotlib.figure import Figure
+  fig = Figure(figsize=(14, 8))
+  ax = fig.subplots()
+  label = "Transliteration"
+  if fit and fit[0] is not None:
+    label += f" (s={fit[0]:.2f}, R²={fit[1]:.2f})"
+  ax.loglog(ranks,
+            frequencies,
+            marker=".",
+            linestyle="none",
+            color="blue",
+            alpha=0.7,
+            markersize=8,
+            label=label)
+  if reference_lines:
+    for ref_label, slope, color, style in REFERENCES:
+      # Anchored at the most frequent word
+      ax.loglog(ranks,
+                frequencies[0] / ranks**slope,
+                linestyle=style,
+                color=color,
+                linewidth=1.5,
+                alpha=0.6,
+                label=f"{ref_label} (s={slope})")
+  ax.set_title("Zipf's Law Analysis", fontsize=20)
+  ax.set_xlabel("Rank (log scale)", fontsize=16)
+  ax.set_ylabel("Frequency (log scale)", fontsize=16)
+  ax.grid(True, which="both", ls="-", alpha=0.2)
+  ax.legend(bbox_to_anchor=(1.02, 1),
+            loc='upper left',
+            borderaxespad=0,
+            fontsize=14)
+  fig.tight_layout()
+  fig.savefig(path, dpi=150, metadata={SIGNATURE_KEY: signature})
+  return True